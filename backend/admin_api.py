@@ -0,0 +1,86 @@
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from backend import http_client
+from backend.cache import cache_stats
+from backend.singleflight import inflight_stats
+from backend.breaker import breaker_stats
+from backend.canonical import canonical_stats
+from backend import warmup
+from backend import profiler
+from backend import metrics
+from backend import config
+import asyncio
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+# Routes that change server state or spend upstream quota need this token;
+# without ADMIN_TOKEN set they are refused outright
+ADMIN_TOKEN = config.get("ADMIN_TOKEN", "")
+
+
+def require_admin(x_admin_token: str = Header("")):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Set ADMIN_TOKEN to enable this admin action.")
+    if not secrets.compare_digest(x_admin_token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token header.")
+
+@router.get("/pool")
+async def get_pool_stats():
+    # Requests vs new TCP connections per upstream; a high reuse_ratio means keep-alive is working
+    return http_client.pool_stats()
+
+@router.get("/cache")
+async def get_cache_stats():
+    # Size, hit/miss and eviction counters for every response cache
+    return await asyncio.to_thread(cache_stats)
+
+@router.get("/inflight")
+async def get_inflight_stats():
+    # Upstream calls made vs duplicate requests that piggybacked on an in-flight call
+    return inflight_stats()
+
+@router.get("/breakers")
+async def get_breaker_stats():
+    # Circuit state, recent failures and shed load per upstream
+    return breaker_stats()
+
+@router.get("/tokens")
+async def get_token_usage():
+    # LLM calls, average prompt/response tokens and invalid replies per endpoint
+    return metrics.llm_usage()
+
+@router.get("/canonical")
+async def get_canonical_stats():
+    # Hit ratio with canonicalized keys vs what the raw input keys would have achieved
+    return canonical_stats()
+
+@router.get("/warmup")
+async def get_warmup_status():
+    # Progress of the cache warm-up job and the share of planned answers now cached
+    return warmup.status()
+
+@router.post("/warmup", dependencies=[Depends(require_admin)])
+async def start_warmup():
+    if warmup.STATUS["running"]:
+        return {"started": False, "status": warmup.status()}
+    warmup.start()
+    return {"started": True}
+
+@router.get("/profiler")
+async def get_profiler_report(limit: int = 50):
+    # Most frequently sampled event-loop stacks since the profiler was started
+    return profiler.report(limit)
+
+@router.get("/profiler/folded", response_class=PlainTextResponse)
+async def get_profiler_folded():
+    # Folded stacks for flamegraph.pl / speedscope
+    return profiler.folded()
+
+@router.post("/profiler", dependencies=[Depends(require_admin)])
+async def toggle_profiler(enabled: bool = True):
+    if enabled:
+        profiler.start()
+    else:
+        profiler.stop()
+    return profiler.report(limit=0)
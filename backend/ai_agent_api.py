@@ -1,20 +1,37 @@
 from fastapi import APIRouter
 from pydantic import BaseModel, Field
-import httpx
-import os
-import json
-import re
-from dotenv import load_dotenv
+from backend.cache import TTLCache
+from backend.gemini import generate_json
+from backend import prompts
+from backend.singleflight import SingleFlight
+from backend.canonical import canonicalize_plan, HitRateTracker
+from backend import crop_engine
+from backend.translation import localize
+from backend import request_log
+import asyncio
+from backend import config
+from backend import metrics
+from backend import deadline
 
-RESPONSE_CACHE = {}
+# Crop plans change slowly, so they can live for a day
+RESPONSE_CACHE = TTLCache.from_env("crop_planner", ttl=24 * 3600)
+PLAN_FLIGHTS = SingleFlight("crop_planner")
+PLAN_KEYS = HitRateTracker("crop_planner")
 
-load_dotenv()
+# How Gemini is used for plans the local engine can answer:
+#   background - answer from the engine now, cache the AI narrative for next time (default)
+#   inline     - wait for the AI narrative (engine answer if it fails)
+#   off        - engine only, no Gemini call
+CROP_ADVICE_MODE = config.get("CROP_ADVICE_MODE", "background").lower()
+# The engine-only answer is cached briefly so a failed narrative is retried soon, not after a day
+CROP_PROVISIONAL_TTL = float(config.get("CROP_PROVISIONAL_TTL", "300"))
+# Keys whose cached plan is still the engine-only answer in this worker
+PROVISIONAL = set()
+# Background narratives by cache key; holding them also keeps them from being garbage collected
+_narratives = {}
 
 router = APIRouter(prefix="/crop_planner", tags=["Crop Planner AI"])
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-3-flash-preview:generateContent?key={GEMINI_API_KEY}"
-
 class AgentInput(BaseModel):
     last_crop: str = Field(..., max_length=50, description="Previous crop harvested")
     soil_type: str = Field(..., max_length=50, description="Type of soil")
@@ -23,70 +40,145 @@ class AgentInput(BaseModel):
     region: str = Field("Unknown", max_length=100, description="Farming region")
     language: str = Field("English", max_length=20, description="User's preferred language") # ADDED
 
+# Response models: Gemini is constrained to their schema and replies are validated against them
+class CropAdvice(BaseModel):
+    reasoning: str = Field(..., description="Markdown bullets")
+    rotation_advice: str = Field(..., description="Markdown bullets")
+
+class CropPlan(BaseModel):
+    soil_score: int = Field(..., ge=0, le=100)
+    recommended_crops: list[str] = Field(..., min_length=1, max_length=5, description="Next crops, best first")
+    reasoning: str = Field(..., description="Markdown bullets")
+    rotation_advice: str = Field(..., description="Markdown bullets")
+
+def plan_key(data: AgentInput):
+    # Key for an already canonicalized input; language is not part of the core
+    return f"{data.last_crop}-{data.soil_type}-{data.rainfall}-{data.season}-{data.region}"
+
+@router.get("/result/{ticket_id}")
+async def get_plan_result(ticket_id: str):
+    # Full plan for a provisional response, once the background call has filled the cache
+    return await deadline.result(ticket_id, RESPONSE_CACHE, plan_crop, AgentInput)
+
 @router.post("")
-async def plan_crop(data: AgentInput):
-    # Create cache key including language
-    cache_key = f"{data.last_crop}-{data.soil_type}-{data.rainfall}-{data.season}-{data.region}-{data.language}"
+async def plan_crop(data: AgentInput, budget_ms: deadline.Budget = None):
+    raw_key = f"{data.last_crop}-{data.soil_type}-{data.rainfall}-{data.season}-{data.region}-{data.language}"
+    # Normalize spelling/case/aliases first so equivalent inputs share one cache entry
+    data = canonicalize_plan(data)
+    request_log.record("crop_planner", data.model_dump())
+    # The cached plan is the language-neutral (English) core; translations are layered on top
+    cache_key = plan_key(data)
 
-    if cache_key in RESPONSE_CACHE:
+    cached = await RESPONSE_CACHE.get(cache_key)
+    PLAN_KEYS.record(raw_key, cached is not None)
+    if cached is not None:
         print("⚡ Serving Crop Plan from Cache (Instant!)")
-        return RESPONSE_CACHE[cache_key]
+        return await localize("crop_planner", cached, data.language)
     
-    prompt = f"""
-    Act as an expert Agronomist.
-    Analyze:
-    - Previous Crop: {data.last_crop}
-    - Soil: {data.soil_type}
-    - Rain: {data.rainfall}
-    - Season: {data.season}
-    - Region: {data.region}
-    
-    Task: Create a crop rotation plan.
-    
-    IMPORTANT LANGUAGE INSTRUCTION:
-    Translate ALL text values in the JSON (like 'recommended_crops', 'reasoning', and 'rotation_advice') into {data.language}. 
-    Do NOT translate the JSON keys (keep them exactly as "soil_score", "recommended_crops", etc.).
-    
-    RETURN JSON ONLY. No Markdown outside the values. Format:
-    {{
-        "soil_score": 85,
-        "recommended_crops": ["Crop A", "Crop B"],
-        "reasoning": "Why these crops fit...",
-        "rotation_advice": "Provide a detailed guide using short paragraphs, bullet points, and bold text for readability."
-    }}
-    """
-
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "responseMimeType": "application/json"
+    # Textbook rotations are answered by the local engine; Gemini only writes the narrative
+    if crop_engine.knows(data.last_crop, data.soil_type):
+        full = lambda: engine_plan(data, cache_key)
+    else:
+        full = lambda: ai_plan(data, cache_key)
+    provisional = lambda: offline_plan(data, note="Showing the built-in rotation rules while the full AI plan is prepared.")[0]
+    return await deadline.answer("crop_planner", budget_ms, full, provisional, RESPONSE_CACHE, cache_key, data.model_dump())
+
+def offline_plan(data: AgentInput, note=None):
+    core = crop_engine.plan(data.last_crop, data.soil_type, data.rainfall, data.season)
+    text = crop_engine.local_text(core)
+    advice = text["rotation_advice"]
+    if note:
+        advice = f"**System Note:** {note}\n\n" + advice
+    return {
+        "soil_score": core["soil_score"],
+        "recommended_crops": core["recommended_crops"],
+        "reasoning": text["reasoning"],
+        "rotation_advice": advice
+    }, core
+
+async def engine_plan(data: AgentInput, cache_key: str):
+    local, core = offline_plan(data)
+    if CROP_ADVICE_MODE == "off":
+        RESPONSE_CACHE.set(cache_key, local)
+        return await localize("crop_planner", local, data.language)
+
+    facts = core["facts"]
+    prompt = prompts.CROP_ADVICE.format(
+        last_crop=data.last_crop, category=facts["category"] or "unknown category", soil_type=data.soil_type,
+        ph=facts["ph"], fertility=facts["fertility"], rainfall=data.rainfall, season=data.season, region=data.region,
+        crops=", ".join(core["recommended_crops"]), benefits="; ".join(facts["benefits"]) or "n/a",
+        tips="; ".join(facts["tips"]) or "n/a"
+    )
+
+    async def fetch_advice():
+        advice = await generate_json(prompt, CropAdvice)
+        result_obj = {
+            "soil_score": core["soil_score"],
+            "recommended_crops": core["recommended_crops"],
+            "reasoning": advice.get("reasoning") or local["reasoning"],
+            "rotation_advice": advice.get("rotation_advice") or local["rotation_advice"]
         }
-    }
+        RESPONSE_CACHE.set(cache_key, result_obj)
+        PROVISIONAL.discard(cache_key)
+        return result_obj
+
+    if CROP_ADVICE_MODE == "background":
+        # Answer from the engine now (cached briefly until the AI narrative
+        # replaces it); the narrative and its translation land in the cache for later requests
+        RESPONSE_CACHE.set(cache_key, local, ttl=CROP_PROVISIONAL_TTL)
+        PROVISIONAL.add(cache_key)
+
+        async def warm():
+            await localize("crop_planner", await PLAN_FLIGHTS.do(cache_key, fetch_advice), data.language)
+        if cache_key not in _narratives:
+            task = asyncio.ensure_future(warm())
+            _narratives[cache_key] = task
+            task.add_done_callback(lambda t: _narrative_done(cache_key, t))
+        return await localize("crop_planner", local, data.language)
 
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.post(GEMINI_URL, json=payload)
-            res_json = response.json()
+        result_obj = await PLAN_FLIGHTS.do(cache_key, fetch_advice)
+    except Exception as e:
+        print(f"⚠️ AI Agent Error: {e}")
+        metrics.fallback("crop_planner")
+        return await localize("crop_planner", local, data.language)
+    return await localize("crop_planner", result_obj, data.language)
 
-        if "error" in res_json:
-             raise Exception(f"Google API Error: {res_json['error'].get('message', res_json['error'])}")
+def _narrative_done(cache_key, task):
+    _narratives.pop(cache_key, None)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️ AI Agent Error: {task.exception()}")
+        metrics.fallback("crop_planner")
 
-        if "candidates" not in res_json or not res_json["candidates"]:
-             raise Exception("AI Response Blocked or Empty")
+async def plan_cached(cache_key: str):
+    # Cached with the AI narrative, not just the engine-only answer (cache warm-up)
+    return cache_key not in PROVISIONAL and await RESPONSE_CACHE.contains(cache_key)
 
-        ai_text = res_json["candidates"][0]["content"]["parts"][0]["text"]
+async def settled_plan(data: AgentInput):
+    # plan_crop for cache warm-up: also waits for the background narrative, so
+    # the job only counts as warmed once the full plan is cached
+    answer = await plan_crop(data)
+    task = _narratives.get(plan_key(canonicalize_plan(data)))
+    if task is not None:
+        await asyncio.wait([task])
+    return answer
 
-        clean_text = re.sub(r"```json|```", "", ai_text).strip()
-        result_obj = json.loads(clean_text, strict=False)
+async def ai_plan(data: AgentInput, cache_key: str):
+    prompt = prompts.CROP_PLAN.format(**data.model_dump())
 
-        RESPONSE_CACHE[cache_key] = result_obj 
+    async def fetch_plan():
+        result_obj = await generate_json(prompt, CropPlan)
+        RESPONSE_CACHE.set(cache_key, result_obj)
         return result_obj
 
+    try:
+        # Identical requests arriving together share a single Gemini call
+        result_obj = await PLAN_FLIGHTS.do(cache_key, fetch_plan)
+
     except Exception as e:
         print(f"⚠️ AI Agent Error: {e}")
-        return {
-            "soil_score": 60,
-            "recommended_crops": ["Legumes (Fallback)", "Cover Crops"],
-            "reasoning": "AI Service is temporarily unavailable. Using standard rotation logic.",
-            "rotation_advice": f"**System Note:** We encountered a connection error. Generally, rotating with nitrogen-fixing legumes is a safe strategy to recover soil health."
-        }
\ No newline at end of file
+        metrics.fallback("crop_planner")
+        fallback, _ = offline_plan(data, note="AI Service is temporarily unavailable. Using the built-in rotation rules.")
+        return await localize("crop_planner", fallback, data.language)
+
+    return await localize("crop_planner", result_obj, data.language)
@@ -0,0 +1,264 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from backend import config
+from backend import metrics
+
+# Circuit breaker plus admission control per upstream. When Gemini or Groq is
+# failing (or answering far too slowly), calls fail fast with CircuitOpen
+# instead of each waiting out the full httpx timeout; the routers' existing
+# fallbacks answer instead. After a cool-down a few probe calls are let
+# through (half-open) and decide whether the circuit closes again.
+# Independently, at most MAX_INFLIGHT calls run at once per upstream, up to
+# MAX_QUEUE more wait at most QUEUE_TIMEOUT seconds, and the rest are shed
+# with Overloaded.
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Every guard created here is registered so /admin/breakers can report on all of them
+GUARDS = {}
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class Overloaded(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Trip on the failure or slow-call ratio over a sliding time window."""
+
+    def __init__(self, name, window=30.0, min_calls=5, failure_ratio=0.5, slow_call=8.0, slow_ratio=0.8,
+                 open_for=15.0, probes=1):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call = slow_call
+        self.slow_ratio = slow_ratio
+        self.open_for = open_for
+        self.probes = probes
+        self.state = CLOSED
+        self._calls = deque()  # (finished_at, ok, slow)
+        self._opened_at = 0.0
+        self._probing = 0
+        self.trips = 0
+        self.short_circuited = 0
+
+    def _trim(self, now):
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+    def allow(self):
+        # Returns True for a half-open probe; raises CircuitOpen when the call must not go out
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_for:
+            self.state = HALF_OPEN
+            self._probing = 0
+        if self.state == CLOSED:
+            return False
+        if self.state == HALF_OPEN and self._probing < self.probes:
+            self._probing += 1
+            return True
+        self.short_circuited += 1
+        raise CircuitOpen(f"{self.name} circuit is {self.state}")
+
+    def record(self, ok, latency, probe):
+        now = time.monotonic()
+        slow = latency >= self.slow_call
+        if probe:
+            self._probing -= 1
+            if ok and not slow:
+                self.state = CLOSED
+                self._calls.clear()
+            else:
+                self._trip(now)
+            return
+        if self.state != CLOSED:
+            return
+        self._calls.append((now, ok, slow))
+        self._trim(now)
+        calls = len(self._calls)
+        if calls < self.min_calls:
+            return
+        failures = sum(1 for _, ok, _ in self._calls if not ok)
+        slow_calls = sum(1 for _, _, slow in self._calls if slow)
+        if failures / calls >= self.failure_ratio or slow_calls / calls >= self.slow_ratio:
+            self._trip(now)
+
+    def release(self, probe):
+        # A probe that ended without a verdict (e.g. cancelled) frees its slot
+        if probe:
+            self._probing -= 1
+
+    def _trip(self, now):
+        if self.state != OPEN:
+            self.trips += 1
+            print(f"⚠️ {self.name} circuit opened for {self.open_for:.0f}s")
+        self.state = OPEN
+        self._opened_at = now
+
+    def stats(self):
+        self._trim(time.monotonic())
+        calls = len(self._calls)
+        return {
+            "state": self.state,
+            "recent_calls": calls,
+            "recent_failures": sum(1 for _, ok, _ in self._calls if not ok),
+            "recent_slow_calls": sum(1 for _, _, slow in self._calls if slow),
+            "trips": self.trips,
+            "short_circuited": self.short_circuited,
+        }
+
+
+class Limiter:
+    """Cap concurrent calls; queue a bounded number and shed the rest."""
+
+    def __init__(self, name, max_inflight=32, max_queue=64, queue_timeout=2.0):
+        self.name = name
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_inflight)
+        self.in_flight = 0
+        self.queued = 0
+        self.shed = 0
+
+    async def acquire(self):
+        if self._slots.locked():
+            if self.queued >= self.max_queue:
+                self.shed += 1
+                raise Overloaded(f"{self.name} queue is full")
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                raise Overloaded(f"{self.name} queue wait exceeded {self.queue_timeout}s")
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "shed": self.shed,
+        }
+
+
+class Call:
+    # Handed to the guarded block; ok() records the verdict early (e.g. once a
+    # stream has started) while the concurrency slot stays held until the block ends
+    def __init__(self, guard, probe):
+        self.guard = guard
+        self.probe = probe
+        self.started = time.monotonic()
+        self.recorded = False
+
+    def ok(self):
+        self._record(True)
+
+    def _record(self, ok):
+        if not self.recorded:
+            self.recorded = True
+            self.guard.breaker.record(ok, time.monotonic() - self.started, self.probe)
+
+
+class Guard:
+    def __init__(self, name, breaker, limiter):
+        self.name = name
+        self.breaker = breaker
+        self.limiter = limiter
+        GUARDS[name] = self
+
+    @classmethod
+    def from_env(cls, name, max_inflight=32):
+        # e.g. GEMINI_BREAKER_FAILURE_RATIO, GEMINI_MAX_INFLIGHT, GEMINI_QUEUE_TIMEOUT
+        prefix = name.upper()
+
+        def setting(key, default):
+            return float(config.get(f"{prefix}_{key}", default))
+        breaker = CircuitBreaker(
+            name,
+            window=setting("BREAKER_WINDOW", 30),
+            min_calls=int(setting("BREAKER_MIN_CALLS", 5)),
+            failure_ratio=setting("BREAKER_FAILURE_RATIO", 0.5),
+            slow_call=setting("BREAKER_SLOW_CALL", 8),
+            slow_ratio=setting("BREAKER_SLOW_RATIO", 0.8),
+            open_for=setting("BREAKER_OPEN_FOR", 15),
+            probes=int(setting("BREAKER_PROBES", 1)),
+        )
+        limiter = Limiter(
+            name,
+            max_inflight=int(setting("MAX_INFLIGHT", max_inflight)),
+            max_queue=int(setting("MAX_QUEUE", 2 * max_inflight)),
+            queue_timeout=setting("QUEUE_TIMEOUT", 2),
+        )
+        return cls(name, breaker, limiter)
+
+    @asynccontextmanager
+    async def call(self):
+        # Raises CircuitOpen / Overloaded before anything is sent upstream; an
+        # exception leaving the block counts as a failed call
+        probe = self.breaker.allow()
+        try:
+            await self.limiter.acquire()
+        except BaseException:
+            # Shed, or cancelled while queued: the probe slot must not leak
+            self.breaker.release(probe)
+            raise
+        call = Call(self, probe)
+        try:
+            yield call
+        except asyncio.CancelledError:
+            if not call.recorded:
+                call.recorded = True
+                self.breaker.release(probe)
+            raise
+        except Exception:
+            call._record(False)
+            raise
+        else:
+            call._record(True)
+        finally:
+            self.limiter.release()
+
+    def stats(self):
+        return {**self.breaker.stats(), **self.limiter.stats()}
+
+
+def breaker_stats():
+    return {name: guard.stats() for name, guard in GUARDS.items()}
+
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+@metrics.collector
+def _breaker_metrics():
+    guards = GUARDS.items()
+    return [
+        ("agroguard_breaker_state", "gauge", "Circuit state: 0 closed, 1 half-open, 2 open.",
+         [({"upstream": name}, STATE_VALUES[guard.breaker.state]) for name, guard in guards]),
+        ("agroguard_breaker_trips_total", "counter", "Times the circuit opened.",
+         [({"upstream": name}, guard.breaker.trips) for name, guard in guards]),
+        ("agroguard_breaker_short_circuited_total", "counter", "Calls answered by a fallback without going upstream.",
+         [({"upstream": name}, guard.breaker.short_circuited) for name, guard in guards]),
+        ("agroguard_upstream_shed_total", "counter", "Calls rejected because the upstream queue was full or too slow.",
+         [({"upstream": name}, guard.limiter.shed) for name, guard in guards]),
+        ("agroguard_upstream_in_flight", "gauge", "Upstream calls currently running.",
+         [({"upstream": name}, guard.limiter.in_flight) for name, guard in guards]),
+        ("agroguard_upstream_queued", "gauge", "Upstream calls waiting for a slot.",
+         [({"upstream": name}, guard.limiter.queued) for name, guard in guards]),
+    ]
@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+from backend import config
+from backend import metrics
+
+
+# Every cache created here is registered so /admin/cache can report on all of them
+CACHES = {}
+
+# Shared on-disk tier; set CACHE_DB_PATH to an empty string to keep caches in memory only
+CACHE_DB_PATH = config.get("CACHE_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "agroguard_cache.sqlite3"))
+CACHE_SWEEP_INTERVAL = float(config.get("CACHE_SWEEP_INTERVAL", "600"))
+
+
+def _approx_size(value):
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return len(repr(value))
+
+
+class SQLiteStore:
+    """Persistent cache tier in a SQLite file running in WAL mode.
+
+    WAL lets several uvicorn workers read while one writes, and a busy timeout
+    makes concurrent writers wait instead of failing. Writes go through a queue
+    to one writer thread (batched into a transaction), so a busy database never
+    stalls the event loop; reads are run off the loop by TTLCache. Expiry uses
+    wall-clock time so entries stay valid across processes and restarts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.errors = 0
+        self._writes = queue.Queue()
+        self._writer = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)")
+
+    def _conn(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        try:
+            row = self._conn().execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"⚠️ Cache DB read error: {e}")
+            return None
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, namespace, key, value, expires_at):
+        # Serialized here, so later changes to the caller's dict cannot race the writer
+        try:
+            encoded = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            self.errors += 1
+            print(f"⚠️ Cache DB write error: {e}")
+            return
+        self._enqueue("INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                      (namespace, key, encoded, expires_at, time.time()))
+
+    def clear(self, namespace):
+        self._enqueue("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+    def _enqueue(self, sql, params):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="cache-writer", daemon=True)
+            self._writer.start()
+        self._writes.put((sql, params))
+
+    def _write_loop(self):
+        conn = self._conn()
+        while True:
+            batch = [self._writes.get()]
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for sql, params in batch:
+                    conn.execute(sql, params)
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"⚠️ Cache DB write error: {e}")
+                if conn.in_transaction:
+                    conn.rollback()
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    def flush(self):
+        # Blocks until every queued write is committed (shutdown, tests)
+        self._writes.join()
+
+    def sweep(self, limits):
+        # Drop expired rows, trim each namespace to its entry limit (oldest first),
+        # then fold the WAL back into the main file so it does not grow forever.
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        for namespace, max_entries in limits.items():
+            removed += conn.execute("""
+                DELETE FROM cache WHERE namespace = ? AND key NOT IN (
+                    SELECT key FROM cache WHERE namespace = ? ORDER BY created_at DESC LIMIT ?
+                )
+            """, (namespace, namespace, max_entries)).rowcount
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def stats(self):
+        rows = self._conn().execute("SELECT namespace, COUNT(*) FROM cache GROUP BY namespace").fetchall()
+        return {
+            "path": self.path,
+            "entries": dict(rows),
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "errors": self.errors,
+        }
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None and CACHE_DB_PATH:
+        try:
+            _store = SQLiteStore(CACHE_DB_PATH)
+        except sqlite3.Error as e:
+            print(f"⚠️ Persistent cache disabled: {e}")
+    return _store
+
+
+class TTLCache:
+    """LRU cache bounded by entry count and approximate bytes, with per-entry expiry."""
+
+    def __init__(self, name, ttl, max_entries=1000, max_bytes=16 * 1024 * 1024, store=None, memory_ttl=None):
+        self.name = name
+        self.store = store
+        self.ttl = ttl
+        # Optional cap on how long the memory tier may answer before re-reading the shared disk tier
+        self.memory_ttl = memory_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_hits = 0
+        CACHES[name] = self
+
+    @classmethod
+    def from_env(cls, name, ttl, max_entries=1000, max_bytes=16 * 1024 * 1024, memory_ttl=None):
+        # e.g. PRICE_CACHE_TTL, PRICE_CACHE_MAX_ENTRIES, PRICE_CACHE_MAX_BYTES
+        prefix = name.upper()
+        return cls(
+            name,
+            ttl=float(config.get(f"{prefix}_CACHE_TTL", ttl)),
+            max_entries=int(config.get(f"{prefix}_CACHE_MAX_ENTRIES", max_entries)),
+            max_bytes=int(config.get(f"{prefix}_CACHE_MAX_BYTES", max_bytes)),
+            store=get_store(),
+            memory_ttl=memory_ttl,
+        )
+
+    async def get(self, key):
+        # Memory hits return without leaving the event loop; only a miss reads the disk tier, in a thread
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, size, value = entry
+                if expires_at >= time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+                self.expirations += 1
+
+        # Fall back to the shared disk tier (filled by other workers or before a restart)
+        if self.store is not None:
+            found = await asyncio.to_thread(self.store.get, self.name, key)
+            if found is not None:
+                value, expires_at = found
+                self._put(key, value, expires_at - time.time())
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def contains(self, key):
+        # Like get() but without touching LRU order or hit/miss counters
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                return True
+        return self.store is not None and await asyncio.to_thread(self.store.get, self.name, key) is not None
+
+    def set(self, key, value, ttl=None):
+        # The disk write is queued; set() never waits on SQLite. ttl overrides the cache default
+        ttl = self.ttl if ttl is None else ttl
+        self._put(key, value, ttl)
+        if self.store is not None:
+            self.store.set(self.name, key, value, time.time() + ttl)
+
+    def _put(self, key, value, ttl):
+        size = _approx_size(value)
+        if size > self.max_bytes:
+            return
+        if self.memory_ttl is not None and self.store is not None:
+            ttl = min(ttl, self.memory_ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+        if self.store is not None:
+            self.store.clear(self.name)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "disk_hits": self.disk_hits,
+        }
+
+
+def cache_stats():
+    report = {name: cache.stats() for name, cache in CACHES.items()}
+    store = get_store()
+    if store is not None:
+        report["_disk"] = store.stats()
+    return report
+
+
+def flush():
+    store = get_store()
+    if store is not None:
+        store.flush()
+
+
+def sweep():
+    store = get_store()
+    if store is None:
+        return 0
+    return store.sweep({name: cache.max_entries for name, cache in CACHES.items() if cache.store is store})
+
+
+async def sweep_forever():
+    # Started from the app lifespan; runs the disk compaction off the event loop
+    while True:
+        await asyncio.sleep(CACHE_SWEEP_INTERVAL)
+        try:
+            removed = await asyncio.to_thread(sweep)
+            if removed:
+                print(f"🧹 Cache sweep removed {removed} entries")
+        except sqlite3.Error as e:
+            print(f"⚠️ Cache sweep error: {e}")
+
+
+@metrics.collector
+def _cache_metrics():
+    caches = CACHES.items()
+    return [
+        ("agroguard_cache_hits_total", "counter", "Cache lookups answered from memory or disk.",
+         [({"cache": name}, cache.hits) for name, cache in caches]),
+        ("agroguard_cache_disk_hits_total", "counter", "Cache hits served by the shared SQLite tier.",
+         [({"cache": name}, cache.disk_hits) for name, cache in caches]),
+        ("agroguard_cache_misses_total", "counter", "Cache lookups that found nothing.",
+         [({"cache": name}, cache.misses) for name, cache in caches]),
+        ("agroguard_cache_evictions_total", "counter", "Entries evicted to stay within the size bounds.",
+         [({"cache": name}, cache.evictions) for name, cache in caches]),
+        ("agroguard_cache_entries", "gauge", "Entries held in memory.",
+         [({"cache": name}, len(cache)) for name, cache in caches]),
+        ("agroguard_cache_bytes", "gauge", "Approximate bytes held in memory.",
+         [({"cache": name}, cache._bytes) for name, cache in caches]),
+    ]
@@ -0,0 +1,191 @@
+import math
+import threading
+from collections import OrderedDict
+from backend import config
+
+
+# Canonicalization runs before every cache lookup so that "Wheat", "wheat " and
+# "WHEAT" (or 24.3°C and 24.6°C) land on the same cache entry.
+
+TEMP_BAND = float(config.get("TEMP_BAND", "2"))            # °C
+HUMIDITY_BAND = float(config.get("HUMIDITY_BAND", "5"))    # % RH
+DAYS_BANDS = [int(d) for d in config.get("DAYS_BANDS", "0,1,3,7,14,30,60,90,180,365").split(",")]
+COST_PRICE_BAND_RATIO = float(config.get("COST_PRICE_BAND_RATIO", "1.25"))  # geometric bands
+
+CROP_ALIASES = {
+    "paddy": "Rice", "dhan": "Rice", "chawal": "Rice",
+    "gehun": "Wheat", "gehu": "Wheat",
+    "corn": "Maize", "makka": "Maize", "makkai": "Maize",
+    "kapas": "Cotton",
+    "ganna": "Sugarcane", "sugar cane": "Sugarcane",
+    "aloo": "Potato", "alu": "Potato",
+    "tamatar": "Tomato",
+    "pyaz": "Onion", "pyaaz": "Onion", "kanda": "Onion",
+    "chana": "Chickpea", "gram": "Chickpea", "bengal gram": "Chickpea",
+    "soya": "Soybean", "soyabean": "Soybean", "soy bean": "Soybean",
+    "peanut": "Groundnut", "moongphali": "Groundnut",
+    "sarson": "Mustard", "rai": "Mustard",
+    "matar": "Peas", "pea": "Peas",
+    "dal": "Pulses", "lentil": "Pulses", "lentils": "Pulses",
+    "pearl millet": "Bajra", "sorghum": "Jowar",
+    "chili": "Chilli", "chilli pepper": "Chilli", "mirchi": "Chilli",
+    "apples": "Apple", "tomatoes": "Tomato", "potatoes": "Potato",
+}
+
+SOIL_ALIASES = {
+    "black": "Black Soil", "regur": "Black Soil", "black cotton soil": "Black Soil",
+    "alluvial": "Alluvial Soil",
+    "red": "Red Soil",
+    "laterite": "Laterite Soil",
+    "desert": "Desert Soil", "arid": "Desert Soil", "sandy": "Desert Soil",
+    "clay": "Clay", "clay soil": "Clay",
+    "loam": "Loam", "loamy": "Loam", "loamy soil": "Loam",
+}
+
+LOCATION_ALIASES = {
+    "bombay": "Mumbai", "calcutta": "Kolkata", "madras": "Chennai",
+    "bangalore": "Bengaluru", "poona": "Pune", "baroda": "Vadodara",
+    "gurgaon": "Gurugram", "orissa": "Odisha", "usa": "United States",
+    "us": "United States", "uk": "United Kingdom",
+}
+
+ACTION_ALIASES = {"store": "Store", "storage": "Store", "sell": "Sell", "transport": "Sell"}
+
+
+def clean(text):
+    # Trim, collapse inner whitespace and case-fold
+    return " ".join(str(text).split()).casefold()
+
+
+def _title(text):
+    return " ".join(word[:1].upper() + word[1:] for word in text.split())
+
+
+def canonical_name(text, aliases):
+    key = clean(text)
+    if not key:
+        return ""
+    if key in aliases:
+        return aliases[key]
+    # "Tomatoes" / "Apples" style plurals
+    for suffix in ("es", "s"):
+        if key.endswith(suffix) and key[:-len(suffix)] in aliases:
+            return aliases[key[:-len(suffix)]]
+    return _title(key)
+
+
+def canonical_location(text):
+    # Keep ", " structure ("Farm, Nashik") but normalize each part
+    parts = [canonical_name(part, LOCATION_ALIASES) for part in str(text).split(",")]
+    return ", ".join(part for part in parts if part)
+
+
+def band(value, width):
+    # Midpoint of the fixed-width band containing value
+    if width <= 0:
+        return value
+    return round((math.floor(value / width) + 0.5) * width, 2)
+
+
+def days_band(days):
+    # Upper edge of the band, so the cached advice covers the longest stay in it
+    for edge in DAYS_BANDS:
+        if days <= edge:
+            return edge
+    return DAYS_BANDS[-1]
+
+
+def cost_band(cost):
+    # Geometric bands: prices that differ by < ~25% share a market estimate
+    if cost <= 0 or COST_PRICE_BAND_RATIO <= 1:
+        return round(cost, 2)
+    index = math.floor(math.log(cost) / math.log(COST_PRICE_BAND_RATIO))
+    return round(COST_PRICE_BAND_RATIO ** (index + 0.5), 2)
+
+
+def canonicalize_plan(data):
+    return data.model_copy(update={
+        "last_crop": canonical_name(data.last_crop, CROP_ALIASES),
+        "soil_type": canonical_name(data.soil_type, SOIL_ALIASES),
+        "rainfall": _title(clean(data.rainfall)),
+        "season": _title(clean(data.season)),
+        "region": canonical_location(data.region) or "Unknown",
+        "language": _title(clean(data.language)) or "English",
+    })
+
+
+def canonicalize_price(data):
+    return data.model_copy(update={
+        "crop": canonical_name(data.crop, CROP_ALIASES),
+        "market_level": _title(clean(data.market_level)),
+        "location": canonical_location(data.location),
+        "product_type": _title(clean(data.product_type)),
+        "month": _title(clean(data.month)),
+        "cost_price": cost_band(data.cost_price),
+        "language": _title(clean(data.language)) or "English",
+    })
+
+
+def canonicalize_spoilage(data):
+    store = canonical_name(data.action_type, ACTION_ALIASES) == "Store"
+    return data.model_copy(update={
+        "action_type": "Store" if store else "Sell",
+        "crop_type": canonical_name(data.crop_type, CROP_ALIASES),
+        "language": _title(clean(data.language)) or "English",
+        # Store-only inputs are irrelevant (and zeroed) for Sell requests and vice versa
+        "temperature": band(data.temperature, TEMP_BAND) if store else 0.0,
+        "humidity": band(data.humidity, HUMIDITY_BAND) if store else 0.0,
+        "storage_type": _title(clean(data.storage_type)) if store else "",
+        "days_stored": days_band(data.days_stored) if store else 0,
+        "current_location": "" if store else canonical_location(data.current_location),
+        "selling_destination": "" if store else canonical_location(data.selling_destination),
+    })
+
+
+# Every tracker created here is registered so /admin/canonical can report on all of them
+TRACKERS = {}
+
+
+class HitRateTracker:
+    """Estimate the hit-rate gain of canonical keys over the raw f-string keys.
+
+    A bounded shadow set remembers recent raw keys; a lookup counts as a raw hit
+    if the exact same raw key was seen before, and as a canonical hit if the
+    real cache answered it.
+    """
+
+    def __init__(self, name, max_keys=5000):
+        self.name = name
+        self.max_keys = max_keys
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.raw_hits = 0
+        self.canonical_hits = 0
+        TRACKERS[name] = self
+
+    def record(self, raw_key, hit):
+        with self._lock:
+            self.lookups += 1
+            if raw_key in self._seen:
+                self.raw_hits += 1
+                self._seen.move_to_end(raw_key)
+            else:
+                self._seen[raw_key] = True
+                if len(self._seen) > self.max_keys:
+                    self._seen.popitem(last=False)
+            if hit:
+                self.canonical_hits += 1
+
+    def stats(self):
+        lookups = self.lookups or 1
+        return {
+            "lookups": self.lookups,
+            "raw_key_hit_ratio": round(self.raw_hits / lookups, 3),
+            "canonical_hit_ratio": round(self.canonical_hits / lookups, 3),
+            "hit_ratio_gain": round((self.canonical_hits - self.raw_hits) / lookups, 3),
+        }
+
+
+def canonical_stats():
+    return {name: tracker.stats() for name, tracker in TRACKERS.items()}
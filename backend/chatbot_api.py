@@ -1,25 +1,73 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-import httpx
-import os
-from dotenv import load_dotenv
+from backend.http_client import get_client
+import json
+from backend import config
+from backend import metrics
+from backend.breaker import Guard
 
 # Initialize Router
 router = APIRouter(prefix="/chatbot", tags=["Groq Chatbot API"])
 
-load_dotenv()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-
-# Make sure this exact URL is used:
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+# Make sure this exact URL is used (GROQ_URL only overrides it for local benchmarks):
+GROQ_URL = config.get("GROQ_URL", "https://api.groq.com/openai/v1/chat/completions")
+# Fails fast with CircuitOpen/Overloaded while Groq is unhealthy or saturated
+GROQ_GUARD = Guard.from_env("groq")
 
 class ChatInput(BaseModel):
     message: str = Field(..., description="The user's message")
     language: str = Field("English", description="The current language of the app")
+    stream: bool = Field(False, description="Relay tokens as Server-Sent Events instead of one JSON reply")
+
+def prompt_text(payload):
+    return "\n".join(message["content"] for message in payload["messages"])
+
+def sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+async def stream_reply(request: Request, headers, payload):
+    # Relay Groq's OpenAI-style stream as SSE "token" events. Leaving the
+    # client.stream() block closes the upstream connection, so Groq stops
+    # generating as soon as the browser goes away.
+    client = get_client("groq")
+    parts, usage = [], {}
+    try:
+        # The concurrency slot is held for the whole relay; the breaker only judges the stream's start
+        async with GROQ_GUARD.call() as call, client.stream("POST", GROQ_URL, headers=headers, json={**payload, "stream": True}) as response:
+            if response.status_code != 200:
+                body = json.loads(await response.aread())
+                raise Exception(body.get("error", {}).get("message", f"HTTP {response.status_code}"))
+            call.ok()
+
+            async for line in response.aiter_lines():
+                if await request.is_disconnected():
+                    print("⚠️ Chat client disconnected, cancelling Groq stream")
+                    return
+                if not line.startswith("data:"):
+                    continue
+                chunk = line[len("data:"):].strip()
+                if chunk == "[DONE]":
+                    break
+                event = json.loads(chunk)
+                # Groq reports token usage on the final chunk
+                usage = event.get("x_groq", {}).get("usage") or usage
+                delta = event["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield sse("token", {"text": delta})
+        metrics.record_llm("groq", prompt_text(payload), "".join(parts), usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        yield sse("done", {})
+
+    except Exception as e:
+        print(f"⚠️ Groq API Error: {e}")
+        metrics.fallback("chatbot")
+        yield sse("error", {"response": f"Sorry, I am having trouble connecting right now. ({str(e)})"})
 
 @router.post("")
-async def chat_with_bot(data: ChatInput):
-    if not GROQ_API_KEY:
+async def chat_with_bot(data: ChatInput, request: Request):
+    groq_api_key = config.get("GROQ_API_KEY")
+    if not groq_api_key:
         return {"response": "Error: GROQ_API_KEY not found in environment variables."}
 
     # Set up the prompt with strict instructions for brief, bulleted answers
@@ -31,7 +79,7 @@ async def chat_with_bot(data: ChatInput):
     )
 
     headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Authorization": f"Bearer {groq_api_key}",
         "Content-Type": "application/json"
     }
 
@@ -45,17 +93,28 @@ async def chat_with_bot(data: ChatInput):
         "max_tokens": 300   # Lowered to ensure brief responses
     }
 
+    if data.stream:
+        return StreamingResponse(
+            stream_reply(request, headers, payload),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        client = get_client("groq")
+        async with GROQ_GUARD.call():
             response = await client.post(GROQ_URL, headers=headers, json=payload)
             res_json = response.json()
 
-        if "error" in res_json:
-             raise Exception(res_json["error"]["message"])
+            if "error" in res_json:
+                 raise Exception(res_json["error"]["message"])
 
         bot_reply = res_json["choices"][0]["message"]["content"]
+        usage = res_json.get("usage", {})
+        metrics.record_llm("groq", prompt_text(payload), bot_reply, usage.get("prompt_tokens"), usage.get("completion_tokens"))
         return {"response": bot_reply}
 
     except Exception as e:
         print(f"⚠️ Groq API Error: {e}")
+        metrics.fallback("chatbot")
         return {"response": f"Sorry, I am having trouble connecting right now. ({str(e)})"}
\ No newline at end of file
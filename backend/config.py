@@ -0,0 +1,13 @@
+import os
+from dotenv import load_dotenv
+
+# .env is loaded exactly once, here; every module reads its settings through get()
+load_dotenv()
+
+
+def get(name, default=None):
+    return os.getenv(name, default)
+
+
+def flag(name, default="0"):
+    return get(name, default).lower() in ("1", "true", "yes")
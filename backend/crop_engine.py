@@ -0,0 +1,165 @@
+import os
+import json
+
+# In-process rotation planner over the bundled data files. Everything is
+# indexed once so a plan is a handful of dict/set lookups.
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+
+# Typical sowing seasons for crops named in the data files (Indian cropping calendar)
+SEASON_CROPS = {
+    "kharif": {"Rice", "Maize", "Cotton", "Soybean", "Groundnut", "Jowar", "Bajra", "Millets", "Pulses", "Sugarcane", "Castor", "Guar", "Chilli"},
+    "rabi": {"Wheat", "Mustard", "Chickpea", "Potato", "Peas", "Barley", "Onion", "Cabbage", "Carrot", "Pulses", "Vegetables"},
+    "zaid": {"Vegetables", "Maize", "Pulses", "Groundnut", "Tomato", "Onion"},
+}
+# Perennial plantation crops do not fit a single season but should not be penalized
+PERENNIALS = {"Tea", "Coffee", "Cashew", "Rubber", "Coconut", "Sugarcane"}
+LEGUMES = {"Pulses", "Chickpea", "Peas", "Soybean", "Groundnut", "Guar"}
+
+RAINFALL_FIT = {
+    "low": {"Bajra", "Millets", "Jowar", "Guar", "Barley", "Mustard", "Chickpea", "Groundnut", "Castor", "Pulses"},
+    "high": {"Rice", "Sugarcane", "Tea", "Rubber", "Coconut", "Jute"},
+}
+
+RULES = {}          # crop -> {"category", "next", "avoid", "benefits"}
+SOILS = {}          # soil -> {"ph", "fertility", "organic_matter", "best", "tips"}
+_loaded = False
+
+
+def load(data_dir=DATA_DIR):
+    global _loaded
+    with open(os.path.join(data_dir, "crop_rotation_rules.json"), encoding="utf-8") as f:
+        rules = json.load(f)
+    with open(os.path.join(data_dir, "soil_profile.json"), encoding="utf-8") as f:
+        soils = json.load(f)
+
+    RULES.clear()
+    for crop, rule in rules.items():
+        RULES[crop] = {
+            "category": rule.get("category", ""),
+            "next": list(rule.get("next_crops", [])),
+            "avoid": set(rule.get("avoid_after", [])),
+            "benefits": list(rule.get("benefits", [])),
+        }
+
+    SOILS.clear()
+    for soil, profile in soils.items():
+        SOILS[soil] = {
+            "ph": profile.get("ph"),
+            "fertility": profile.get("fertility_score", 60),
+            "organic_matter": profile.get("organic_matter", ""),
+            "best": list(profile.get("best_crops", [])),
+            "tips": list(profile.get("regeneration_tips", [])),
+        }
+    _loaded = True
+    print(f"🌱 Crop engine loaded {len(RULES)} rotation rules and {len(SOILS)} soil profiles")
+
+
+def ensure_loaded():
+    if not _loaded:
+        load()
+
+
+def _season_key(season):
+    text = season.casefold()
+    for key in SEASON_CROPS:
+        if key in text:
+            return key
+    if "monsoon" in text:
+        return "kharif"
+    if "winter" in text:
+        return "rabi"
+    if "summer" in text:
+        return "zaid"
+    return None
+
+
+def knows(last_crop, soil_type):
+    ensure_loaded()
+    return last_crop in RULES or soil_type in SOILS
+
+
+def plan(last_crop, soil_type, rainfall, season):
+    # Returns the language-neutral part of a crop plan: soil_score,
+    # recommended_crops and the facts used to pick them.
+    ensure_loaded()
+    rule = RULES.get(last_crop)
+    soil = SOILS.get(soil_type)
+    season_key = _season_key(season)
+    rain_key = rainfall.casefold() if rainfall.casefold() in RAINFALL_FIT else None
+
+    avoid = set(rule["avoid"]) if rule else {last_crop}
+    candidates = {}
+    if rule:
+        for rank, crop in enumerate(rule["next"]):
+            candidates[crop] = 3.0 - rank * 0.2
+    if soil:
+        for rank, crop in enumerate(soil["best"]):
+            candidates[crop] = candidates.get(crop, 0.0) + 2.0 - rank * 0.1
+    if not candidates:
+        candidates = {crop: 1.0 for crop in ("Pulses", "Groundnut", "Vegetables")}
+
+    for crop in list(candidates):
+        if crop in avoid:
+            del candidates[crop]
+            continue
+        if season_key and crop not in PERENNIALS:
+            candidates[crop] += 1.0 if crop in SEASON_CROPS[season_key] else -1.5
+        if rain_key:
+            candidates[crop] += 0.5 if crop in RAINFALL_FIT[rain_key] else 0.0
+        if rule and rule["category"] in ("Cereal", "Cash Crop") and crop in LEGUMES:
+            # Legumes restore the nitrogen that cereals and cane draw down
+            candidates[crop] += 0.5
+
+    recommended = sorted(candidates, key=lambda crop: -candidates[crop])[:4]
+
+    score = soil["fertility"] if soil else 60
+    if rule and rule["category"] in ("Cereal", "Cash Crop"):
+        score -= 5
+    if last_crop in LEGUMES:
+        score += 5
+    if soil and soil["ph"] is not None and not 6.0 <= soil["ph"] <= 7.5:
+        score -= 5
+    score = max(0, min(100, int(score)))
+
+    return {
+        "soil_score": score,
+        "recommended_crops": recommended,
+        "facts": {
+            "last_crop": last_crop,
+            "category": rule["category"] if rule else None,
+            "benefits": rule["benefits"] if rule else [],
+            "avoid": sorted(avoid),
+            "soil": soil_type if soil else None,
+            "ph": soil["ph"] if soil else None,
+            "fertility": soil["fertility"] if soil else None,
+            "organic_matter": soil["organic_matter"] if soil else None,
+            "tips": soil["tips"] if soil else [],
+            "season": season_key,
+        },
+    }
+
+
+def local_text(result):
+    # English reasoning and rotation advice built from the data files; used
+    # when Gemini is off or unreachable.
+    facts = result["facts"]
+    crops = ", ".join(result["recommended_crops"])
+    reasons = []
+    if facts["category"]:
+        reasons.append(f"{facts['last_crop']} ({facts['category']}) rotates well into {crops}")
+    if facts["soil"]:
+        reasons.append(f"{facts['soil']} (pH {facts['ph']}, fertility {facts['fertility']}/100, {facts['organic_matter']} organic matter) suits these crops")
+    if facts["season"]:
+        reasons.append(f"the picks favour crops sown in the {facts['season'].title()} season")
+    if not facts["category"] and not facts["soil"]:
+        reasons.insert(0, "Standard rotation logic: follow with nitrogen-fixing legumes and cover crops")
+    reasoning = "; ".join(reasons)
+    reasoning = reasoning[:1].upper() + reasoning[1:] + "."
+
+    lines = [f"- **Next crops:** {crops}"]
+    if facts["avoid"]:
+        lines.append(f"- **Avoid planting:** {', '.join(facts['avoid'])} right after {facts['last_crop']}")
+    lines += [f"- {benefit}" for benefit in facts["benefits"]]
+    lines += [f"- {tip}" for tip in facts["tips"]]
+    return {"reasoning": reasoning, "rotation_advice": "\n".join(lines)}
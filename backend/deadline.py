@@ -0,0 +1,74 @@
+import asyncio
+import secrets
+from typing import Annotated
+from fastapi import Query
+from backend.cache import TTLCache
+from backend import metrics
+from backend import request_log
+
+# Latency budgets for clients that need some answer quickly (SMS gateways,
+# low-bandwidth pages). If the full answer is not ready within budget_ms, the
+# offline answer is returned at once, marked provisional, with a ticket; the
+# upstream call keeps running in the background and fills the cache, and
+# GET /<endpoint>/result/{ticket} returns the full answer once it is there.
+
+# Optional ?budget_ms= query parameter; None (the default) waits for the full answer,
+# 0 answers provisionally unless the full answer is ready at once
+Budget = Annotated[float | None, Query(ge=0, description="Answer provisionally if the full result takes longer (ms)")]
+
+# Tickets go through the shared disk tier, so any worker can answer a poll; the
+# memory copy lives only a few seconds so a ticket settled on another worker
+# is not reported as pending for the rest of the hour
+TICKETS = TTLCache.from_env("tickets", ttl=3600, max_entries=10000, memory_ttl=2)
+
+# Keep references so background completions are not garbage collected mid-flight
+_background = set()
+
+
+async def _settle(ticket_id, ticket, cache):
+    # The routers fall back instead of raising, so the cache tells success apart
+    status = "ready" if await cache.contains(ticket["cache_key"]) else "failed"
+    TICKETS.set(ticket_id, {**ticket, "status": status})
+
+
+def _finish(ticket_id, ticket, cache, task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️ Background completion failed for ticket {ticket_id}: {task.exception()}")
+    settle = asyncio.ensure_future(_settle(ticket_id, ticket, cache))
+    _background.add(settle)
+    settle.add_done_callback(_background.discard)
+
+
+async def answer(endpoint, budget_ms, full, provisional, cache, cache_key, request):
+    # full() is the router's normal uncached path; provisional() its offline answer
+    if budget_ms is None:
+        return await full()
+    task = asyncio.ensure_future(full())
+    try:
+        # Shield so hitting the budget does not cancel the upstream call
+        return await asyncio.wait_for(asyncio.shield(task), budget_ms / 1000)
+    except asyncio.TimeoutError:
+        pass
+
+    ticket_id = secrets.token_urlsafe(12)
+    ticket = {"endpoint": endpoint, "cache_key": cache_key, "request": request, "status": "pending"}
+    TICKETS.set(ticket_id, ticket)
+    _background.add(task)
+    task.add_done_callback(lambda t: _finish(ticket_id, ticket, cache, t))
+    metrics.PROVISIONAL.inc(endpoint=endpoint)
+    print(f"⏱️ {endpoint} budget of {budget_ms:.0f} ms exceeded, provisional answer with ticket {ticket_id}")
+    return {**provisional(), "provisional": True, "ticket": ticket_id, "poll": f"/{endpoint}/result/{ticket_id}"}
+
+
+async def result(ticket_id, cache, handler, model):
+    # Lightweight poll: never starts a new upstream call for the ticket's request
+    ticket = await TICKETS.get(ticket_id)
+    if ticket is None:
+        return {"status": "expired", "error": "Unknown or expired ticket."}
+    if not await cache.contains(ticket["cache_key"]):
+        return {"status": ticket["status"]}
+    # Served from the cache through the normal handler (cost rebasing, translation);
+    # a repeat of the same request is not new demand for the request log
+    request_log.RECORDING.set(False)
+    return {"status": "ready", "result": await handler(model(**ticket["request"]))}
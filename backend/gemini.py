@@ -0,0 +1,112 @@
+import json
+import re
+import time
+from functools import cache
+from backend.http_client import get_client
+from backend import config
+from backend import metrics
+from backend.breaker import Guard
+
+GEMINI_MODEL_URL = config.get("GEMINI_MODEL_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-3-flash-preview:generateContent")
+# Extra attempts when a reply does not parse or does not match the response model
+GEMINI_PARSE_RETRIES = int(config.get("GEMINI_PARSE_RETRIES", "1"))
+
+# Fails fast with CircuitOpen/Overloaded while Gemini is unhealthy or saturated
+GEMINI_GUARD = Guard.from_env("gemini")
+
+FENCE = re.compile(r"```json|```")
+
+
+def gemini_url():
+    # Built per call rather than at import time, so importing a router stays cheap
+    return f"{GEMINI_MODEL_URL}?key={config.get('GEMINI_API_KEY')}"
+
+
+@cache
+def response_schema(model):
+    # Gemini's responseSchema (an OpenAPI subset) for a pydantic model, built once per model
+    spec = model.model_json_schema()
+    defs = spec.get("$defs", {})
+
+    def convert(node):
+        if "$ref" in node:
+            node = defs[node["$ref"].rsplit("/", 1)[-1]]
+        kind = node["type"]
+        out = {"type": kind.upper()}
+        if "description" in node:
+            out["description"] = node["description"]
+        if "enum" in node:
+            out["enum"] = [str(value) for value in node["enum"]]
+        if kind == "object":
+            out["properties"] = {name: convert(prop) for name, prop in node["properties"].items()}
+            out["required"] = node.get("required", list(node["properties"]))
+        elif kind == "array":
+            out["items"] = convert(node["items"])
+            for key in ("minItems", "maxItems"):
+                if key in node:
+                    out[key] = node[key]
+        elif kind in ("integer", "number"):
+            for key in ("minimum", "maximum"):
+                if key in node:
+                    out[key] = node[key]
+        return out
+
+    return convert(spec)
+
+
+async def _generate(prompt, schema):
+    generation_config = {"responseMimeType": "application/json"}
+    if schema is not None:
+        generation_config["responseSchema"] = response_schema(schema)
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": generation_config
+    }
+
+    client = get_client("gemini")
+    async with GEMINI_GUARD.call():
+        response = await client.post(gemini_url(), json=payload)
+        res_json = response.json()
+
+        if "error" in res_json:
+            raise Exception(f"Google API Error: {res_json['error'].get('message', res_json['error'])}")
+
+    if "candidates" not in res_json or not res_json["candidates"]:
+        raise Exception("AI Response Blocked or Empty")
+
+    ai_text = res_json["candidates"][0]["content"]["parts"][0]["text"]
+    usage = res_json.get("usageMetadata", {})
+    metrics.record_llm("gemini", prompt, ai_text, usage.get("promptTokenCount"), usage.get("candidatesTokenCount"))
+    return ai_text
+
+
+def parse(text, schema):
+    # Schema-constrained replies are bare JSON; the fence cleanup is only for free-form ones
+    if text.lstrip().startswith("```"):
+        text = FENCE.sub("", text).strip()
+    if schema is None:
+        return json.loads(text, strict=False)
+    try:
+        return schema.model_validate_json(text).model_dump()
+    except ValueError:
+        # Second chance for raw control characters inside strings
+        return schema.model_validate(json.loads(text, strict=False)).model_dump()
+
+
+async def generate_json(prompt, schema=None):
+    # Shared Gemini call used by every router; raises on any failure so the
+    # caller can decide on its own fallback answer. With a pydantic response
+    # model, Gemini is constrained to its schema and the reply is validated
+    # against it (retried once), so the result always has the model's fields.
+    for attempt in range(GEMINI_PARSE_RETRIES + 1):
+        ai_text = await _generate(prompt, schema)
+        started = time.perf_counter()
+        try:
+            return parse(ai_text, schema)
+        except ValueError as e:
+            metrics.LLM_INVALID.inc(provider="gemini", endpoint=metrics.current_endpoint())
+            if attempt == GEMINI_PARSE_RETRIES:
+                raise
+            print(f"⚠️ Invalid Gemini reply, retrying: {str(e)[:200]}")
+        finally:
+            metrics.JSON_PARSE.observe(time.perf_counter() - started, provider="gemini")
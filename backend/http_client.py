@@ -0,0 +1,153 @@
+import time
+import httpx
+from contextvars import ContextVar
+from backend import config
+from backend import metrics
+
+
+# One pooled AsyncClient per upstream, created in the app lifespan (see main.py)
+# and shared by every router, so TCP+TLS handshakes are reused across requests.
+UPSTREAMS = {
+    "gemini": float(config.get("GEMINI_TIMEOUT", "20")),
+    "groq": float(config.get("GROQ_TIMEOUT", "15")),
+    "open_meteo": float(config.get("OPEN_METEO_TIMEOUT", "10")),
+}
+
+MAX_CONNECTIONS = int(config.get("UPSTREAM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(config.get("UPSTREAM_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(config.get("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+CONNECT_TIMEOUT = float(config.get("UPSTREAM_CONNECT_TIMEOUT", "5"))
+USE_HTTP2 = config.flag("UPSTREAM_HTTP2")
+
+_clients = {}
+_stats = {}
+
+# A caller that sets this to a dict gets every upstream request made in its
+# context counted there, including requests from tasks it starts (warm-up pacing)
+CALL_COUNTER = ContextVar("upstream_call_counter", default=None)
+
+
+def _http2_available():
+    if not USE_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("⚠️ UPSTREAM_HTTP2 is set but the 'h2' package is missing, using HTTP/1.1")
+        return False
+
+
+def _make_trace(name):
+    # httpcore reports every new TCP connection through the "trace" extension,
+    # which lets us tell fresh handshakes apart from reused keep-alive sockets.
+    async def trace(event, info):
+        if event == "connection.connect_tcp.complete":
+            _stats[name]["connections_opened"] += 1
+    return trace
+
+
+def _make_hooks(name):
+    trace = _make_trace(name)
+
+    async def on_request(request):
+        _stats[name]["requests"] += 1
+        counter = CALL_COUNTER.get()
+        if counter is not None:
+            counter["requests"] += 1
+        request.extensions["trace"] = trace
+        request.extensions["started"] = time.perf_counter()
+
+    async def on_response(response):
+        _stats[name]["responses"] += 1
+        started = response.request.extensions.get("started")
+        if started is not None:
+            metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - started, provider=name, status=response.status_code)
+    return {"request": [on_request], "response": [on_response]}
+
+
+class _CountingTransport(httpx.AsyncHTTPTransport):
+    # Response hooks never run for connect errors or timeouts, so those are counted here
+    def __init__(self, name, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+
+    async def handle_async_request(self, request):
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            _stats[self.name]["failed"] += 1
+            raise
+
+
+def _build_client(name):
+    timeout = UPSTREAMS.get(name, 20.0)
+    http2 = _http2_available()
+    _stats.setdefault(name, {"requests": 0, "responses": 0, "failed": 0, "connections_opened": 0})
+    _stats[name]["http2"] = http2
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=min(CONNECT_TIMEOUT, timeout)),
+        transport=_CountingTransport(
+            name,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            http2=http2,
+        ),
+        event_hooks=_make_hooks(name),
+    )
+
+
+def get_client(name):
+    # Lazily created so routers still work if the lifespan hook never ran
+    # (e.g. when a router is mounted on its own app in a script).
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = _build_client(name)
+    return client
+
+
+async def startup():
+    for name in UPSTREAMS:
+        get_client(name)
+
+
+async def shutdown():
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
+
+
+def pool_stats():
+    report = {}
+    for name, counts in _stats.items():
+        responses = counts["responses"]
+        opened = counts["connections_opened"]
+        reused = max(responses - opened, 0)
+        report[name] = {
+            "requests": counts["requests"],
+            "responses": responses,
+            "failed": counts["failed"],
+            "in_flight": max(counts["requests"] - responses - counts["failed"], 0),
+            "connections_opened": opened,
+            "connections_reused": reused,
+            "reuse_ratio": round(reused / responses, 3) if responses else 0.0,
+            "timeout": UPSTREAMS.get(name),
+            "http2": counts["http2"],
+        }
+    return report
+
+
+@metrics.collector
+def _pool_metrics():
+    stats = pool_stats()
+    return [
+        ("agroguard_upstream_failures_total", "counter", "Upstream requests that ended without a response.",
+         [({"provider": name}, counts["failed"]) for name, counts in stats.items()]),
+        ("agroguard_upstream_requests_total", "counter", "Upstream requests sent.",
+         [({"provider": name}, counts["requests"]) for name, counts in stats.items()]),
+        ("agroguard_upstream_connections_opened_total", "counter", "New TCP connections per upstream.",
+         [({"provider": name}, counts["connections_opened"]) for name, counts in stats.items()]),
+    ]
@@ -1,23 +1,276 @@
 # main.py
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import importlib
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from backend.ai_agent_api import router as agent_router
-from backend.spoilage_api import router as spoilage_router # Check this import
-from backend.price_api import router as price_router
-from backend.chatbot_api import router as chatbot_router # Check this import
-from backend.weather_api import router as weather_router
+from fastapi.responses import PlainTextResponse
+from starlette.datastructures import Headers, MutableHeaders
+from backend import config
+from backend import metrics
+from backend import profiler
+from backend import http_client
+from backend import responses
+from backend import cache
+from backend import request_log
+from backend import crop_engine
+
+# FAST_STARTUP=1 answers /healthz right away and only imports a router on the
+# first request under its prefix (the rest load in the background). The
+# default keeps the old behaviour: everything is imported before serving.
+FAST_STARTUP = config.flag("FAST_STARTUP")
+
+# path prefix -> router module
+ROUTERS = {
+    "/crop_planner": "backend.ai_agent_api",
+    "/spoilage": "backend.spoilage_api",
+    "/price": "backend.price_api",
+    "/chatbot": "backend.chatbot_api",
+    "/weather": "backend.weather_api",
+    "/admin": "backend.admin_api",
+}
+# The API docs need every route, so these load all routers
+DOCS_PATHS = ("/docs", "/redoc", "/openapi.json")
+
+# Where startup time goes; served by /healthz/startup
+STARTUP = {
+    "mode": "fast" if FAST_STARTUP else "eager",
+    "started_at": time.time(),
+    "ready_at": None,
+    "imports_ms": {},
+    "phases_ms": {},
+}
+MOUNTED = set()
+_mount_lock = asyncio.Lock()
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def import_router(prefix):
+    # Timed import of one router module; the first import pays for its dependencies
+    name = ROUTERS[prefix]
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    STARTUP["imports_ms"].setdefault(name, _elapsed_ms(started))
+    return module
+
+
+def mount_router(prefix):
+    if prefix in MOUNTED:
+        return
+    app.include_router(import_router(prefix).router)
+    MOUNTED.add(prefix)
+    # Rebuild /openapi.json with the new routes on the next docs request
+    app.openapi_schema = None
+
+
+async def ensure_router(prefix):
+    if prefix in MOUNTED:
+        return
+    async with _mount_lock:
+        if prefix not in MOUNTED:
+            # The import is the slow part; keep it off the event loop
+            await asyncio.to_thread(import_router, prefix)
+            mount_router(prefix)
+
+
+def routers_for(path):
+    if path.startswith(DOCS_PATHS):
+        return list(ROUTERS)
+    return [prefix for prefix in ROUTERS if path == prefix or path.startswith(prefix + "/")]
+
+
+class LazyRouterMiddleware:
+    # Mounts the router for a path before the request reaches the app's routing
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for prefix in routers_for(scope["path"]):
+                await ensure_router(prefix)
+        await self.app(scope, receive, send)
+
+
+class MetricsMiddleware:
+    # Per-route latency histogram; also tags the request so upstream and LLM
+    # metrics recorded inside the router are attributed to this endpoint
+    def __init__(self, app):
+        self.app = app
 
-app = FastAPI()
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = {"code": 500}
+        token = metrics.ROUTE.set(scope)
 
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.ROUTE.reset(token)
+            metrics.HTTP_LATENCY.observe(time.perf_counter() - started, method=scope["method"],
+                                         route=metrics.route_label(scope), status=status["code"])
+
+
+class ResponseMiddleware:
+    # ETag / If-None-Match and gzip/brotli for responses sent as one body
+    # message; streamed bodies (chatbot SSE, NDJSON batches) pass through as is.
+    # The AI routers are POST lookups that do not change state, so a matching
+    # If-None-Match gets a 304 there as it would on a GET.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+        request_headers = Headers(scope=scope)
+        accepted = responses.accepted_encodings(request_headers.get("accept-encoding", ""))
+        if_none_match = request_headers.get("if-none-match")
+        held = {}
+
+        async def buffered_send(message):
+            if message["type"] == "http.response.start":
+                held["start"] = message
+                return
+            start = held.pop("start", None)
+            if start is None:
+                return await send(message)
+            if message["type"] != "http.response.body" or message.get("more_body", False):
+                await send(start)
+                return await send(message)
+            await self.finish(scope, start, message.get("body", b""), accepted, if_none_match, send)
+
+        await self.app(scope, receive, buffered_send)
+
+    async def finish(self, scope, start, body, accepted, if_none_match, send):
+        headers = MutableHeaders(raw=start["headers"])
+        content_type = headers.get("content-type", "")
+        if start["status"] != 200 or "content-encoding" in headers:
+            await send(start)
+            return await send({"type": "http.response.body", "body": body})
+
+        compress = responses.compressible(content_type, len(body))
+        if compress:
+            headers.add_vary_header("Accept-Encoding")
+        if content_type.startswith("application/json"):
+            headers["etag"] = tag = responses.etag(body)
+            if if_none_match and responses.etag_matches(if_none_match, tag):
+                metrics.NOT_MODIFIED.inc(route=metrics.route_label(scope))
+                del headers["content-length"]
+                del headers["content-type"]
+                await send({**start, "status": 304})
+                return await send({"type": "http.response.body", "body": b""})
+
+        if compress:
+            encoding = responses.choose_encoding(accepted)
+            metrics.RESPONSE_BYTES.inc(len(body), encoding=encoding or "identity", kind="uncompressed")
+            if encoding:
+                if len(body) >= responses.COMPRESS_THREAD_BYTES:
+                    body = await asyncio.to_thread(responses.compress, body, encoding)
+                else:
+                    body = responses.compress(body, encoding)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+            metrics.RESPONSE_BYTES.inc(len(body), encoding=encoding or "identity", kind="sent")
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
+
+
+async def preload_routers():
+    # Fast mode: load the remaining routers once the server is already answering
+    started = time.perf_counter()
+    for prefix in ROUTERS:
+        try:
+            await ensure_router(prefix)
+        except Exception as e:
+            print(f"⚠️ Router preload error ({prefix}): {e}")
+    STARTUP["phases_ms"]["background_preload"] = _elapsed_ms(started)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    background = []
+    if FAST_STARTUP:
+        # Upstream clients and the crop index are created on first use
+        background.append(asyncio.create_task(preload_routers()))
+    else:
+        # Open the pooled upstream clients once and share them across all routers
+        phase = time.perf_counter()
+        await http_client.startup()
+        STARTUP["phases_ms"]["http_client_startup"] = _elapsed_ms(phase)
+        # Index the bundled rotation and soil data once
+        phase = time.perf_counter()
+        crop_engine.load()
+        STARTUP["phases_ms"]["crop_engine_load"] = _elapsed_ms(phase)
+    if profiler.PROFILER_ENABLED:
+        profiler.start()
+    # Periodically expire and compact the shared on-disk cache
+    background.append(asyncio.create_task(cache.sweep_forever()))
+    background.append(asyncio.create_task(request_log.flush_forever()))
+    # Optionally precompute popular answers in the background
+    if config.flag("WARMUP_ON_STARTUP"):
+        from backend import warmup
+        background.append(asyncio.create_task(warmup.warm_forever()))
+    STARTUP["phases_ms"]["lifespan"] = _elapsed_ms(started)
+    STARTUP["ready_at"] = time.time()
+    print(f"🚀 Ready in {STARTUP['mode']} mode: {STARTUP['phases_ms']} imports={STARTUP['imports_ms']}")
+    yield
+    for task in background:
+        task.cancel()
+    profiler.stop()
+    await http_client.shutdown()
+    # Commit cache writes still queued for the disk tier
+    await asyncio.to_thread(cache.flush)
+    await asyncio.to_thread(request_log.flush)
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(LazyRouterMiddleware)
+app.add_middleware(ResponseMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["https://agrogaurd-1.onrender.com"], # This allows your HTML to talk to the API
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"], # Lets browser fetches read it for If-None-Match revalidation
 )
 
-app.include_router(agent_router)
-app.include_router(spoilage_router) # Make sure this line exists
-app.include_router(price_router) # Make sure this line exists
-app.include_router(chatbot_router) # Make sure this line exists
-app.include_router(weather_router) # Make sure this line exists
\ No newline at end of file
+@app.get("/")
+@app.get("/healthz")
+async def healthz():
+    # Cheap readiness probe; never waits for routers or upstream clients
+    return {
+        "status": "ok",
+        "ready": STARTUP["ready_at"] is not None,
+        "uptime_s": round(time.time() - STARTUP["started_at"], 1),
+        "routers_loaded": sorted(MOUNTED),
+    }
+
+@app.get("/healthz/startup")
+async def startup_report():
+    # Per-module import times and lifespan phases, for tuning cold starts
+    return {**STARTUP, "routers_loaded": sorted(MOUNTED), "routers_pending": [p for p in ROUTERS if p not in MOUNTED]}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+if not FAST_STARTUP:
+    for prefix in ROUTERS:
+        mount_router(prefix)
+
+STARTUP["phases_ms"]["main_import"] = _elapsed_ms(_IMPORT_STARTED)
@@ -0,0 +1,184 @@
+import contextvars
+import threading
+from backend import config
+
+# Minimal Prometheus-style metrics, rendered as text by GET /metrics. Counters
+# and histograms are updated on the hot path; cache, single-flight and pool
+# numbers are already counted where they happen and are only read at scrape time.
+
+# ASGI scope of the request being served, set by the metrics middleware in
+# main.py so upstream calls deep in a router can be attributed to an endpoint.
+# Labels use the route template (/price/result/{ticket_id}), never the raw path.
+ROUTE = contextvars.ContextVar("metrics_route", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+METRICS_ENABLED = config.flag("METRICS_ENABLED", "1")
+
+# Every metric created here is registered so /metrics can render all of them
+REGISTRY = {}
+COLLECTORS = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {round(series[-1], 6)}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+def collector(fn):
+    # fn() returns [(name, type, help, [(labels dict, value), ...]), ...] at scrape time
+    COLLECTORS.append(fn)
+    return fn
+
+
+HTTP_LATENCY = Histogram("agroguard_http_request_duration_seconds", "Time to serve a request, by route template.",
+                         ["method", "route", "status"])
+UPSTREAM_LATENCY = Histogram("agroguard_upstream_request_duration_seconds", "Time to upstream response headers.",
+                             ["provider", "status"])
+FALLBACKS = Counter("agroguard_fallbacks_total", "Answers served from a local fallback because an upstream call failed.",
+                    ["endpoint"])
+PROVISIONAL = Counter("agroguard_provisional_answers_total", "Offline answers returned because the latency budget ran out.",
+                      ["endpoint"])
+NOT_MODIFIED = Counter("agroguard_http_not_modified_total", "Requests answered 304 because the client's ETag still matched.",
+                       ["route"])
+RESPONSE_BYTES = Counter("agroguard_http_response_bytes_total", "JSON/text response bytes before and after compression.",
+                         ["encoding", "kind"])
+LLM_PROMPT_BYTES = Histogram("agroguard_llm_prompt_bytes", "Prompt size sent to the LLM.",
+                             ["provider", "endpoint"], buckets=SIZE_BUCKETS)
+LLM_RESPONSE_BYTES = Histogram("agroguard_llm_response_bytes", "Generated text size returned by the LLM.",
+                               ["provider", "endpoint"], buckets=SIZE_BUCKETS)
+LLM_TOKENS = Counter("agroguard_llm_tokens_total", "Tokens reported by the provider.", ["provider", "endpoint", "kind"])
+LLM_INVALID = Counter("agroguard_llm_invalid_responses_total", "LLM replies that did not parse or match the response model.",
+                      ["provider", "endpoint"])
+JSON_PARSE = Histogram("agroguard_llm_json_parse_seconds", "Time to clean up and parse the LLM's JSON text.",
+                       ["provider"], buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+
+
+def route_label(scope):
+    # Starlette's router fills in scope["route"] once a route matched; unknown paths share one label
+    return getattr(scope.get("route"), "path", "unmatched")
+
+
+def current_endpoint():
+    scope = ROUTE.get()
+    return "background" if scope is None else route_label(scope)
+
+
+def fallback(endpoint):
+    FALLBACKS.inc(endpoint=endpoint)
+
+
+def record_llm(provider, prompt, text, prompt_tokens=None, response_tokens=None):
+    endpoint = current_endpoint()
+    LLM_PROMPT_BYTES.observe(len(prompt.encode("utf-8")), provider=provider, endpoint=endpoint)
+    LLM_RESPONSE_BYTES.observe(len(text.encode("utf-8")), provider=provider, endpoint=endpoint)
+    if prompt_tokens is not None:
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, endpoint=endpoint, kind="prompt")
+    if response_tokens is not None:
+        LLM_TOKENS.inc(response_tokens, provider=provider, endpoint=endpoint, kind="response")
+
+
+def llm_usage():
+    # Per endpoint and provider: LLM calls and average prompt/response tokens and bytes
+    report = {}
+    with LLM_PROMPT_BYTES._lock, LLM_RESPONSE_BYTES._lock, LLM_TOKENS._lock, LLM_INVALID._lock:
+        for (provider, endpoint), series in LLM_PROMPT_BYTES._values.items():
+            calls = sum(series[:-1])
+            response = LLM_RESPONSE_BYTES._values.get((provider, endpoint), [0.0])
+            prompt_tokens = LLM_TOKENS._values.get((provider, endpoint, "prompt"), 0)
+            response_tokens = LLM_TOKENS._values.get((provider, endpoint, "response"), 0)
+            report.setdefault(endpoint, {})[provider] = {
+                "calls": calls,
+                "prompt_tokens": prompt_tokens,
+                "response_tokens": response_tokens,
+                "avg_prompt_tokens": round(prompt_tokens / calls, 1),
+                "avg_response_tokens": round(response_tokens / calls, 1),
+                "avg_prompt_bytes": round(series[-1] / calls, 1),
+                "avg_response_bytes": round(response[-1] / calls, 1),
+                "invalid_responses": LLM_INVALID._values.get((provider, endpoint), 0),
+            }
+    return report
+
+
+def render():
+    lines = []
+    for metric in REGISTRY.values():
+        lines += metric.render()
+    for fn in COLLECTORS:
+        for name, kind, help, samples in fn():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels, labels.values())} {_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -1,20 +1,23 @@
 from fastapi import APIRouter
 from pydantic import BaseModel, Field
-import httpx
-import os
-import json
-import re
-from dotenv import load_dotenv
+from backend.cache import TTLCache
+from backend.gemini import generate_json
+from backend import prompts
+from backend.responses import FastJSONResponse
+from backend.singleflight import SingleFlight
+from backend.canonical import canonicalize_price, HitRateTracker
+from backend.translation import localize
+from backend import request_log
+from backend import metrics
+from backend import deadline
 
 # Initialize Router
-router = APIRouter(prefix="/price", tags=["Market Price AI"])
+router = APIRouter(prefix="/price", tags=["Market Price AI"], default_response_class=FastJSONResponse)
 
-# Simple Cache to save API calls
-PRICE_CACHE = {}
-
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-3-flash-preview:generateContent?key={GEMINI_API_KEY}"
+# Market prices go stale quickly, so keep them for an hour by default
+PRICE_CACHE = TTLCache.from_env("price", ttl=3600)
+PRICE_FLIGHTS = SingleFlight("price")
+PRICE_KEYS = HitRateTracker("price")
 
 class PriceInput(BaseModel):
     crop: str = Field(..., max_length=50, description="Name of the crop")
@@ -25,99 +28,96 @@ class PriceInput(BaseModel):
     cost_price: float = Field(..., ge=0, description="Cost price to calculate profit, must be >= 0")
     language: str = Field("English", max_length=20, description="User's preferred language") # ADDED
 
-@router.post("")
-async def predict_market_price(data: PriceInput):
-    # Create a unique key for caching that includes language
-    cache_key = f"{data.crop}-{data.market_level}-{data.location}-{data.product_type}-{data.month}-{data.cost_price}-{data.language}"
-    
-    if cache_key in PRICE_CACHE:
-        print(f"⚡ Serving Market Data from Cache: {cache_key}")
-        return PRICE_CACHE[cache_key]
+# Response model: Gemini is constrained to its schema and replies are validated against it
+class PriceEstimate(BaseModel):
+    currency: str = Field(..., description="Local currency symbol, e.g. ₹ or $")
+    predicted_price: float
+    predicted_profit: float
+    top_10_names: list[str] = Field(..., min_length=10, max_length=10, description="Alternative markets")
+    top_10_prices: list[float] = Field(..., min_length=10, max_length=10)
+    top_10_profits: list[float] = Field(..., min_length=10, max_length=10)
+    expenditure_breakdown: str = Field(..., description="Markdown bullets")
+    analysis: str = Field(..., description="Markdown bullets")
+    logistics_advice: str = Field(..., description="Markdown bullets")
 
-    prompt = f"""
-    Act as an Agricultural Data Simulator. Provide a simulated market analysis for educational purposes.
-    
-    Data:
-    - Crop: {data.crop}
-    - Location: {data.location}
-    - Market Level: {data.market_level}
-    - Type: {data.product_type}
-    - Timeframe: {data.month}
-    - Farmer's Cost Price: {data.cost_price}
-    
-    Instructions:
-    1. Determine the local currency symbol for {data.location} (e.g., '₹' for India, '$' for US).
-    2. Estimate a realistic selling price in that currency.
-    3. Estimate all relevant expenditures (Taxes, Tariffs, GST, Transportation, and Handling) based on the Market Level and Type.
-    4. Calculate 'predicted_profit' (Selling Price - {data.cost_price} - Total Expenditures).
-    5. Provide exactly 10 alternative markets/locations where this could be sold.
-    6. Provide 10 realistic prices for those markets.
-    7. Provide 10 profit margins for those markets (Market Price - {data.cost_price} - Estimated Expenditures for that route).
-    
-    IMPORTANT FORMATTING INSTRUCTION:
-    The values for 'expenditure_breakdown', 'analysis', and 'logistics_advice' MUST be formatted exclusively as Markdown bullet points. Do NOT write paragraphs.
-    
-    IMPORTANT LANGUAGE INSTRUCTION:
-    Translate ALL text values in the JSON (like 'top_10_names', 'expenditure_breakdown', 'analysis', and 'logistics_advice') into {data.language}. 
-    Do NOT translate the JSON keys (keep them exactly as "currency", "predicted_price", etc.).
-    
-    RETURN ONLY JSON:
-    {{
-        "currency": "₹",
-        "predicted_price": 2500,
-        "predicted_profit": 350,
-        "top_10_names": ["Market A", "Market B", ...],
-        "top_10_prices": [2500, 2450, ...],
-        "top_10_profits": [350, 300, ...],
-        "expenditure_breakdown": "- GST (5%): 125\\n- Transport: 25... (strictly bullet points)",
-        "analysis": "- Price is expected to rise due to...\\n- High demand in... (strictly bullet points)",
-        "logistics_advice": "- Use cold storage for...\\n- Route via... (strictly bullet points)"
-    }}
-    """
+def rebase_profit(result, from_cost, to_cost):
+    # Profit = price - cost - expenditure, so a different cost price only shifts
+    # every profit figure; recompute locally instead of asking Gemini again.
+    if from_cost == to_cost:
+        return result
+    shift = from_cost - to_cost
+    rebased = dict(result)
+    try:
+        rebased["predicted_profit"] = round(float(result["predicted_profit"]) + shift, 2)
+        rebased["top_10_profits"] = [round(float(p) + shift, 2) for p in result.get("top_10_profits", [])]
+    except (KeyError, TypeError, ValueError):
+        return result
+    return rebased
+
+def price_key(data: PriceInput):
+    # Key for an already canonicalized input; language is not part of the core
+    return f"{data.crop}-{data.market_level}-{data.location}-{data.product_type}-{data.month}-{data.cost_price}"
 
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "responseMimeType": "application/json"
-        }
+def offline_price(raw: PriceInput):
+    base_cost = raw.cost_price if raw.cost_price > 0 else 50.0 
+    dummy_price = base_cost * 1.5 
+    dummy_expenditure = base_cost * 0.15 # 15% estimated expenditure fallback
+    dummy_profit = dummy_price - base_cost - dummy_expenditure
+    
+    return {
+        "currency": "$",
+        "predicted_price": round(dummy_price, 2),
+        "predicted_profit": round(dummy_profit, 2),
+        "top_10_names": [f"{raw.location} Hub", "North Region", "South Region", "East Region", "West Region", "Central", "Port A", "Port B", "Border 1", "Border 2"],
+        "top_10_prices": [dummy_price + 5, dummy_price + 3, dummy_price + 2, dummy_price, dummy_price - 1, dummy_price - 2, dummy_price - 3, dummy_price - 4, dummy_price - 5, dummy_price - 6],
+        "top_10_profits": [dummy_profit + 2, dummy_profit + 1, dummy_profit, dummy_profit - 1, dummy_profit - 2, dummy_profit - 3, dummy_profit - 4, dummy_profit - 5, dummy_profit - 6, dummy_profit - 7],
+        "expenditure_breakdown": "- Estimated Transport: 10%\n- Estimated Taxes: 5%\n*AI Unreachable, using fallbacks.*",
+        "analysis": "- ⚠️ AI Unreachable\n- Using estimated offline baseline based on your cost price.",
+        "logistics_advice": "- Cannot generate dynamic routes at this time.\n- Proceed with standard local logistics."
     }
 
-    try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.post(GEMINI_URL, json=payload)
-            res_json = response.json()
-        
-        if "error" in res_json:
-             raise Exception(f"Google API Error: {res_json['error'].get('message', res_json['error'])}")
+@router.get("/result/{ticket_id}")
+async def get_price_result(ticket_id: str):
+    # Full answer for a provisional response, once the background call has filled the cache
+    return FastJSONResponse(await deadline.result(ticket_id, PRICE_CACHE, price_answer, PriceInput))
+
+@router.post("")
+async def predict_market_price(data: PriceInput, budget_ms: deadline.Budget = None):
+    # Returned as a response so FastAPI skips jsonable_encoder; the answer is plain JSON already
+    return FastJSONResponse(await price_answer(data, budget_ms))
+
+async def price_answer(data: PriceInput, budget_ms=None):
+    raw_key = f"{data.crop}-{data.market_level}-{data.location}-{data.product_type}-{data.month}-{data.cost_price}-{data.language}"
+    # Normalize names and band the cost price; the cached answer is computed at the
+    # band's cost and rebased to the farmer's exact cost on the way out.
+    raw, data = data, canonicalize_price(data)
+    request_log.record("price", data.model_dump())
+    # The cached answer is the language-neutral (English) core; translations are layered on top
+    cache_key = price_key(data)
+    
+    cached = await PRICE_CACHE.get(cache_key)
+    PRICE_KEYS.record(raw_key, cached is not None)
+    if cached is not None:
+        print(f"⚡ Serving Market Data from Cache: {cache_key}")
+        return rebase_profit(await localize("price", cached, data.language), data.cost_price, raw.cost_price)
+
+    prompt = prompts.PRICE.format(**data.model_dump())
 
-        if "candidates" not in res_json or not res_json["candidates"]:
-             raise Exception("AI Response Blocked or Empty")
-            
-        ai_text = res_json["candidates"][0]["content"]["parts"][0]["text"]
-        
-        # Clean and parse JSON
-        clean_text = re.sub(r"```json|```", "", ai_text).strip()
-        result_json = json.loads(clean_text)
-        
+    async def fetch_price():
+        result_json = await generate_json(prompt, PriceEstimate)
         # Save to Cache
-        PRICE_CACHE[cache_key] = result_json
+        PRICE_CACHE.set(cache_key, result_json)
         return result_json
 
-    except Exception as e:
-        print(f"⚠️ Market AI Error: {e}")
-        base_cost = data.cost_price if data.cost_price > 0 else 50.0 
-        dummy_price = base_cost * 1.5 
-        dummy_expenditure = base_cost * 0.15 # 15% estimated expenditure fallback
-        dummy_profit = dummy_price - base_cost - dummy_expenditure
-        
-        return {
-            "currency": "$",
-            "predicted_price": round(dummy_price, 2),
-            "predicted_profit": round(dummy_profit, 2),
-            "top_10_names": [f"{data.location} Hub", "North Region", "South Region", "East Region", "West Region", "Central", "Port A", "Port B", "Border 1", "Border 2"],
-            "top_10_prices": [dummy_price + 5, dummy_price + 3, dummy_price + 2, dummy_price, dummy_price - 1, dummy_price - 2, dummy_price - 3, dummy_price - 4, dummy_price - 5, dummy_price - 6],
-            "top_10_profits": [dummy_profit + 2, dummy_profit + 1, dummy_profit, dummy_profit - 1, dummy_profit - 2, dummy_profit - 3, dummy_profit - 4, dummy_profit - 5, dummy_profit - 6, dummy_profit - 7],
-            "expenditure_breakdown": "- Estimated Transport: 10%\n- Estimated Taxes: 5%\n*AI Unreachable, using fallbacks.*",
-            "analysis": "- ⚠️ AI Unreachable\n- Using estimated offline baseline based on your cost price.",
-            "logistics_advice": "- Cannot generate dynamic routes at this time.\n- Proceed with standard local logistics."
-        }
\ No newline at end of file
+    async def full():
+        try:
+            # Identical requests arriving together share a single Gemini call
+            result_json = await PRICE_FLIGHTS.do(cache_key, fetch_price)
+            return rebase_profit(await localize("price", result_json, data.language), data.cost_price, raw.cost_price)
+
+        except Exception as e:
+            print(f"⚠️ Market AI Error: {e}")
+            metrics.fallback("price")
+            return offline_price(raw)
+
+    return await deadline.answer("price", budget_ms, full, lambda: offline_price(raw), PRICE_CACHE, cache_key, raw.model_dump())
@@ -0,0 +1,89 @@
+import sys
+import threading
+import time
+from collections import Counter
+from backend import config
+
+# Sampling profiler for the event loop thread. While enabled, a daemon thread
+# snapshots the loop's Python stack every PROFILER_INTERVAL_MS and counts
+# identical stacks; the result comes out in "folded" form (one line per stack,
+# frames joined by ";"), which flamegraph.pl and speedscope read directly.
+# Off by default: PROFILER_ENABLED=1 starts it with the app, or toggle it with
+# POST /admin/profiler.
+PROFILER_ENABLED = config.flag("PROFILER_ENABLED")
+PROFILER_INTERVAL_MS = float(config.get("PROFILER_INTERVAL_MS", "10"))
+PROFILER_MAX_STACKS = int(config.get("PROFILER_MAX_STACKS", "5000"))
+
+_samples = Counter()
+_lock = threading.Lock()
+_state = {"thread": None, "target": None, "started_at": None, "samples": 0, "dropped": 0}
+_stop = threading.Event()
+
+
+def _folded(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def _run():
+    interval = PROFILER_INTERVAL_MS / 1000
+    target = _state["target"]
+    while not _stop.wait(interval):
+        frame = sys._current_frames().get(target)
+        if frame is None:
+            continue
+        stack = _folded(frame)
+        with _lock:
+            _state["samples"] += 1
+            # Bound memory on long runs; new stacks beyond the cap are only counted
+            if stack in _samples or len(_samples) < PROFILER_MAX_STACKS:
+                _samples[stack] += 1
+            else:
+                _state["dropped"] += 1
+
+
+def running():
+    thread = _state["thread"]
+    return thread is not None and thread.is_alive()
+
+
+def start():
+    # Call from the event loop thread: that is the thread that gets sampled
+    if running():
+        return
+    with _lock:
+        _samples.clear()
+        _state.update(samples=0, dropped=0, started_at=time.time(), target=threading.get_ident())
+    _stop.clear()
+    _state["thread"] = threading.Thread(target=_run, name="agroguard-profiler", daemon=True)
+    _state["thread"].start()
+
+
+def stop():
+    if running():
+        _stop.set()
+        _state["thread"].join()
+
+
+def report(limit=50):
+    with _lock:
+        total = _state["samples"] or 1
+        top = [{"stack": stack, "samples": count, "share": round(count / total, 4)}
+               for stack, count in _samples.most_common(limit)]
+        return {
+            "running": running(),
+            "interval_ms": PROFILER_INTERVAL_MS,
+            "started_at": _state["started_at"],
+            "samples": _state["samples"],
+            "dropped": _state["dropped"],
+            "top": top,
+        }
+
+
+def folded():
+    with _lock:
+        return "".join(f"{stack} {count}\n" for stack, count in _samples.items())
@@ -0,0 +1,50 @@
+# Compact prompt templates shared by the Gemini routers. The reply's shape,
+# field types, list lengths and the "Markdown bullets" hints travel in the
+# responseSchema derived from each router's response model (see
+# gemini.generate_json), so a prompt only carries the facts and the content
+# rules a schema cannot express. Templates are plain str.format strings.
+
+CROP_PLAN = (
+    "You are an expert agronomist. Plan the next crop rotation.\n"
+    "Previous crop: {last_crop}. Soil: {soil_type}. Rainfall: {rainfall}. Season: {season}. Region: {region}.\n"
+    "rotation_advice is a practical guide with bold key terms."
+)
+
+CROP_ADVICE = (
+    "You are an expert agronomist. The next crops are already chosen; explain them.\n"
+    "Previous crop: {last_crop} ({category}). Soil: {soil_type}, pH {ph}, fertility {fertility}/100. "
+    "Rainfall: {rainfall}. Season: {season}. Region: {region}.\n"
+    "Next crops, in order: {crops}. Rotation benefits: {benefits}. Soil tips: {tips}.\n"
+    "rotation_advice is a practical guide with bold key terms."
+)
+
+PRICE = (
+    "Simulate a market analysis for educational purposes.\n"
+    "Crop: {crop}. Location: {location}. Market level: {market_level}. Type: {product_type}. "
+    "Month: {month}. Farmer's cost price: {cost_price}.\n"
+    "Use the local currency of {location}. Expenditures cover taxes, tariffs, GST, transport and handling. "
+    "Profit = price - {cost_price} - expenditures, for the main estimate and for each of the 10 alternative markets."
+)
+
+SPOILAGE_STORE = (
+    "You are a post-harvest loss prevention expert. Assess storing this lot.\n"
+    "Crop: {crop_type}. Temperature: {temperature}±{temp_spread}°C. Humidity: {humidity}±{humidity_spread}%. "
+    "Storage: {storage_type}. Days to store: up to {days_stored}.\n"
+    "The advice must hold across these whole ranges; do not quote a single temperature, humidity or day count. "
+    "Focus on storage longevity, fungal/bacterial risk and ventilation/cooling needs. "
+    "Set logistics_recommendation and top_routes to \"N/A\" and average_transit_days to 0."
+)
+
+SPOILAGE_SELL = (
+    "You are a post-harvest supply chain analyst. Assess transporting this lot for sale.\n"
+    "Crop: {crop_type}. From: {current_location}. To: {selling_destination}.\n"
+    "Focus on transit time, road conditions, climate along the route and vehicle types. "
+    "top_routes is a numbered list."
+)
+
+# The reply is JSON via responseMimeType; its shape is checked by translation._merge
+TRANSLATE = (
+    "Translate every value in this JSON from English into {language}.\n"
+    "Keep the JSON keys, list lengths, numbers, currency symbols and Markdown formatting exactly as they are.\n"
+    "{texts}"
+)
@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import contextvars
+from collections import Counter
+from backend import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is only safe with a single worker
+    fcntl = None
+
+
+# Append-only JSONL log of canonicalized requests. The warm-up job reads it to
+# find the combinations farmers actually ask for. Set REQUEST_LOG_PATH to an
+# empty string to turn it off. record() only appends to an in-memory buffer;
+# flush_forever() (started from the app lifespan) writes it out in a thread,
+# holding a file lock so workers do not rotate the log over each other.
+REQUEST_LOG_PATH = config.get("REQUEST_LOG_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "request_log.jsonl"))
+REQUEST_LOG_MAX_BYTES = int(config.get("REQUEST_LOG_MAX_BYTES", str(8 * 1024 * 1024)))
+REQUEST_LOG_FLUSH_INTERVAL = float(config.get("REQUEST_LOG_FLUSH_INTERVAL", "2"))
+# Lines kept in memory between flushes; beyond this the oldest are dropped
+REQUEST_LOG_BUFFER = 10000
+
+_lock = threading.Lock()
+_pending = []
+STATS = {"dropped": 0}
+# Cleared inside background jobs (e.g. the warm-up) whose calls are not real demand
+RECORDING = contextvars.ContextVar("request_log_recording", default=True)
+
+
+def record(endpoint, payload):
+    if not REQUEST_LOG_PATH or not RECORDING.get():
+        return
+    line = json.dumps({"ts": int(time.time()), "endpoint": endpoint, "input": payload}, ensure_ascii=False)
+    with _lock:
+        if len(_pending) >= REQUEST_LOG_BUFFER:
+            del _pending[0]
+            STATS["dropped"] += 1
+        _pending.append(line)
+
+
+def flush():
+    # Blocking; run it in a thread from async code
+    if not REQUEST_LOG_PATH:
+        return
+    with _lock:
+        lines = _pending[:]
+        _pending.clear()
+    if not lines:
+        return
+    try:
+        directory = os.path.dirname(REQUEST_LOG_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(REQUEST_LOG_PATH + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Keep one rotated generation so the log never grows without bound
+            if os.path.exists(REQUEST_LOG_PATH) and os.path.getsize(REQUEST_LOG_PATH) > REQUEST_LOG_MAX_BYTES:
+                os.replace(REQUEST_LOG_PATH, REQUEST_LOG_PATH + ".1")
+            with open(REQUEST_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+    except OSError as e:
+        print(f"⚠️ Request log error: {e}")
+
+
+async def flush_forever():
+    while True:
+        await asyncio.sleep(REQUEST_LOG_FLUSH_INTERVAL)
+        await asyncio.to_thread(flush)
+
+
+def top(endpoint, limit):
+    # Most frequent inputs for an endpoint, most popular first
+    if not REQUEST_LOG_PATH:
+        return []
+    flush()
+    counts = Counter()
+    for path in (REQUEST_LOG_PATH + ".1", REQUEST_LOG_PATH):
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("endpoint") == endpoint:
+                    counts[json.dumps(entry["input"], sort_keys=True, ensure_ascii=False)] += 1
+    return [json.loads(payload) for payload, _ in counts.most_common(limit)]
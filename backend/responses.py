@@ -0,0 +1,85 @@
+import gzip
+import hashlib
+import json
+from fastapi.responses import JSONResponse
+from backend import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response encoding helpers for the response layer in main.py: a faster JSON
+# encoder for the routers with large Markdown payloads, weak ETags over the
+# identity body (so they survive compression and are the same on every worker
+# for the same cached answer) and gzip/brotli compression above a size threshold.
+# orjson and brotli are in requirements.txt; a trimmed install without them
+# falls back to the stdlib encoder and gzip.
+
+COMPRESS_MIN_BYTES = int(config.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(config.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(config.get("BROTLI_QUALITY", "5"))
+# Bodies this large are compressed off the event loop
+COMPRESS_THREAD_BYTES = 256 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class FastJSONResponse(JSONResponse):
+    # Same output as JSONResponse (UTF-8, compact separators), several times faster with orjson
+    def render(self, content):
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def etag(body):
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match, tag):
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    if if_none_match.strip() == "*":
+        return True
+    opaque = tag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def accepted_encodings(header):
+    # Codings listed in Accept-Encoding with a non-zero q value
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name.strip() and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def compressible(content_type, size):
+    return size >= COMPRESS_MIN_BYTES and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def choose_encoding(accepted):
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
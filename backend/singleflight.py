@@ -0,0 +1,60 @@
+import asyncio
+from backend import metrics
+
+# Every group created here is registered so /admin/inflight can report on all of them
+GROUPS = {}
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one in-flight task.
+
+    The first caller for a key starts the work; everyone arriving while it runs
+    awaits the same task and receives the same result or the same exception.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+        self.leaders = 0
+        self.followers = 0
+        GROUPS[name] = self
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        # Shield so one client disconnecting does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._inflight),
+            "upstream_calls": self.leaders,
+            "coalesced": self.followers,
+        }
+
+
+def inflight_stats():
+    return {name: group.stats() for name, group in GROUPS.items()}
+
+
+@metrics.collector
+def _singleflight_metrics():
+    return [
+        ("agroguard_singleflight_calls_total", "counter", "Calls that started upstream work.",
+         [({"group": name}, group.leaders) for name, group in GROUPS.items()]),
+        ("agroguard_singleflight_coalesced_total", "counter", "Calls that joined an in-flight duplicate.",
+         [({"group": name}, group.followers) for name, group in GROUPS.items()]),
+    ]
@@ -1,19 +1,32 @@
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-import httpx
-import os
+from typing import Literal
+import asyncio
 import json
-import re
-from dotenv import load_dotenv
+import numpy as np
+from backend.cache import TTLCache
+from backend.gemini import generate_json
+from backend import prompts
+from backend.responses import FastJSONResponse
+from backend.singleflight import SingleFlight
+from backend.canonical import canonicalize_spoilage, canonical_name, CROP_ALIASES, HitRateTracker, TEMP_BAND, HUMIDITY_BAND
+from backend import spoilage_model
+from backend.translation import localize, BASE_LANGUAGE
+from backend import request_log
+from backend import config
+from backend import metrics
+from backend import deadline
 
-router = APIRouter(prefix="/spoilage", tags=["Spoilage AI Agent"])
+router = APIRouter(prefix="/spoilage", tags=["Spoilage AI Agent"], default_response_class=FastJSONResponse)
 
-SPOILAGE_CACHE = {}
+SPOILAGE_CACHE = TTLCache.from_env("spoilage", ttl=6 * 3600)
+SPOILAGE_FLIGHTS = SingleFlight("spoilage")
+SPOILAGE_KEYS = HitRateTracker("spoilage")
 
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-# Keeping your requested model version
-GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-3-flash-preview:generateContent?key={GEMINI_API_KEY}"
+# Batch assessments fan out to Gemini with bounded concurrency
+BATCH_CONCURRENCY = int(config.get("SPOILAGE_BATCH_CONCURRENCY", "8"))
+BATCH_MAX_LOTS = int(config.get("SPOILAGE_BATCH_MAX_LOTS", "1000"))
 
 class SpoilageInput(BaseModel):
     action_type: str = Field(..., max_length=20, description="Store or Sell")
@@ -28,116 +41,190 @@ class SpoilageInput(BaseModel):
     current_location: str = Field("", max_length=100, description="Current location")
     selling_destination: str = Field("", max_length=100, description="Target destination")
 
-@router.post("/predict")
-async def predict_spoilage(data: SpoilageInput):
-    cache_key = f"{data.action_type}-{data.crop_type}-{round(data.temperature, 1)}-{round(data.humidity, 1)}-{data.storage_type}-{data.days_stored}-{data.current_location}-{data.selling_destination}-{data.language}"
+class SpoilageBatchInput(BaseModel):
+    lots: list[SpoilageInput] = Field(..., min_length=1, max_length=BATCH_MAX_LOTS, description="Inventory lots to assess")
+
+class SpoilageGridInput(BaseModel):
+    crop_type: str = Field(..., max_length=50, description="Name of the crop")
+    storage_type: str = Field("Standard Godown", max_length=50, description="Type of storage")
+    days_stored: int = Field(7, ge=0, description="Number of days stored")
+    temp_min: float = Field(0.0, ge=-50, le=100)
+    temp_max: float = Field(45.0, ge=-50, le=100)
+    temp_steps: int = Field(24, ge=2, le=200)
+    humidity_min: float = Field(30.0, ge=0, le=100)
+    humidity_max: float = Field(100.0, ge=0, le=100)
+    humidity_steps: int = Field(15, ge=2, le=200)
+
+# Response model: Gemini is constrained to its schema and replies are validated against it
+class LogisticsViability(BaseModel):
+    Refrigerated: int = Field(..., ge=0, le=100)
+    Standard: int = Field(..., ge=0, le=100)
+    Rail: int = Field(..., ge=0, le=100)
+
+class SpoilageAssessment(BaseModel):
+    risk_score: int = Field(..., ge=0, le=100)
+    risk_level: Literal["Low", "Medium", "High"]
+    cross_advice: str = Field(..., description="One line on the alternative action (store vs sell)")
+    analysis: str = Field(..., description="Markdown bullets")
+    logistics_recommendation: str = Field(..., description="Markdown bullets")
+    top_routes: str
+    average_transit_days: float
+    estimated_temp: float
+    estimated_humidity: float
+    logistics_viability: LogisticsViability
+
+def spoilage_key(data: SpoilageInput):
+    # Key for an already canonicalized input; language is not part of the core
+    return f"{data.action_type}-{data.crop_type}-{data.temperature}-{data.humidity}-{data.storage_type}-{data.days_stored}-{data.current_location}-{data.selling_destination}"
+
+def rebase_readings(result, data, raw):
+    # Store assessments are cached per temperature/humidity band; echo the
+    # farmer's own readings rather than the band midpoint (price rebases profit the same way)
+    if data.action_type != "Store":
+        return result
+    return {**result, "estimated_temp": raw.temperature, "estimated_humidity": raw.humidity}
+
+async def lookup(data: SpoilageInput):
+    raw_key = f"{data.action_type}-{data.crop_type}-{round(data.temperature, 1)}-{round(data.humidity, 1)}-{data.storage_type}-{data.days_stored}-{data.current_location}-{data.selling_destination}-{data.language}"
+    # Normalize names and bucket temperature/humidity/days so near-identical lots
+    # share one assessment; the offline fallback still uses the exact raw values.
+    raw, data = data, canonicalize_spoilage(data)
+    request_log.record("spoilage", data.model_dump())
+    # The cached assessment is the language-neutral (English) core; translations are layered on top
+    cache_key = spoilage_key(data)
     
-    if cache_key in SPOILAGE_CACHE:
+    cached = await SPOILAGE_CACHE.get(cache_key)
+    SPOILAGE_KEYS.record(raw_key, cached is not None)
+    return raw, data, cache_key, cached
+
+@router.post("/predict")
+async def predict_spoilage(data: SpoilageInput, budget_ms: deadline.Budget = None):
+    # Returned as a response so FastAPI skips jsonable_encoder; the answer is plain JSON already
+    return FastJSONResponse(await spoilage_answer(data, budget_ms))
+
+async def spoilage_answer(data: SpoilageInput, budget_ms=None):
+    raw, data, cache_key, cached = await lookup(data)
+    if cached is not None:
         print(f"⚡ Serving Spoilage Data from Cache")
-        return SPOILAGE_CACHE[cache_key]
+        return rebase_readings(await localize("spoilage", cached, data.language), data, raw)
+    return await deadline.answer("spoilage", budget_ms, lambda: assess(raw, data, cache_key),
+                                 lambda: offline_assessment(raw, data), SPOILAGE_CACHE, cache_key, raw.model_dump())
 
-    if data.action_type == "Store":
-        context = f"""
-        Action: STORE
-        Crop: {data.crop_type}
-        Current Temp: {data.temperature}°C
-        Current Humidity: {data.humidity}%
-        Storage Type: {data.storage_type}
-        Days to Store: {data.days_stored}
-        """
-        requirements = """
-        Focus heavily on storage longevity, fungal/bacterial risk, and exact ventilation/cooling needs.
-        Output MUST include "risk_score" (0-100), "risk_level" (Low/Medium/High), "cross_advice", "analysis" (Markdown format), "logistics_recommendation" (N/A for Store).
-        Set "top_routes" to "N/A", "average_transit_days" to 0, "estimated_temp" to the input temp, and "estimated_humidity" to the input humidity.
-        Provide a "logistics_viability" dictionary with transport modes as keys (e.g., "Refrigerated", "Standard") and percentage viability (0-100) as values.
-        """
-    else: 
-        context = f"""
-        Action: SELL / TRANSPORT
-        Crop: {data.crop_type}
-        Origin: {data.current_location}
-        Destination: {data.selling_destination}
-        """
-        requirements = """
-        Focus heavily on transit time, road conditions, climate changes during transport, and best vehicle types.
-        Output MUST include "risk_score" (0-100), "risk_level" (Low/Medium/High), "cross_advice", "analysis" (Markdown format), "logistics_recommendation" (Markdown format).
-        Provide a string for "top_routes" (list format).
-        Provide integers/floats for "average_transit_days", "estimated_temp", and "estimated_humidity".
-        Provide a "logistics_viability" dictionary with transport modes as keys and percentage viability (0-100) as values.
-        """
-
-    prompt = f"""
-    Act as a Post-Harvest Loss Prevention Expert and Supply Chain Analyst.
-    {context}
-    
-    {requirements}
+@router.get("/result/{ticket_id}")
+async def get_spoilage_result(ticket_id: str):
+    # Full assessment for a provisional response, once the background call has filled the cache
+    return FastJSONResponse(await deadline.result(ticket_id, SPOILAGE_CACHE, spoilage_answer, SpoilageInput))
 
-    IMPORTANT LANGUAGE INSTRUCTION:
-    Translate ALL text values in the JSON (like 'cross_advice', 'analysis', 'logistics_recommendation', and 'top_routes') into {data.language}. 
-    Do NOT translate the JSON keys (keep them exactly as "risk_score", "analysis", etc.).
-    
-    RETURN ONLY JSON:
-    {{
-        "risk_score": 45,
-        "risk_level": "Medium",
-        "cross_advice": "Brief advice on alternative action.",
-        "analysis": "### Spoilage Risk Analysis\\n...",
-        "logistics_recommendation": "### Transport Strategy\\n...",
-        "top_routes": "1. Route A\\n2. Route B",
-        "average_transit_days": 2,
-        "estimated_temp": 25.5,
-        "estimated_humidity": 60.0,
-        "logistics_viability": {{"Refrigerated": 95, "Standard": 40, "Rail": 60}}
-    }}
-    """
-
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"responseMimeType": "application/json"}
+@router.post("/predict/batch")
+async def predict_spoilage_batch(data: SpoilageBatchInput):
+    # Streams one NDJSON line per lot as soon as it is ready: English cache hits
+    # first, then Gemini results and translated cache hits as they complete (at
+    # most BATCH_CONCURRENCY upstream calls at a time, translations included).
+    # Lots that canonicalize to the same key share a single assessment.
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(indices, raw, lot, cache_key):
+        async with semaphore:
+            return indices, False, await assess(raw, lot, cache_key)
+
+    async def translate(indices, cached, language):
+        async with semaphore:
+            return indices, True, await localize("spoilage", cached, language)
+
+    async def stream():
+        waiting = {}  # (cache_key, language) -> lot indices
+        readings = []  # index -> (canonical, raw) lot, to echo each lot's own readings
+        ready = []
+        pending = []
+        try:
+            # Every upstream call is started before anything is yielded
+            for index, lot in enumerate(data.lots):
+                raw, lot, cache_key, cached = await lookup(lot)
+                readings.append((lot, raw))
+                group = (cache_key, lot.language)
+                if cached is not None and lot.language == BASE_LANGUAGE:
+                    ready.append((index, cached))
+                elif group in waiting:
+                    waiting[group].append(index)
+                else:
+                    waiting[group] = [index]
+                    if cached is not None:
+                        pending.append(asyncio.ensure_future(translate(waiting[group], cached, lot.language)))
+                    else:
+                        pending.append(asyncio.ensure_future(run(waiting[group], raw, lot, cache_key)))
+            for index, result in ready:
+                result = rebase_readings(result, *readings[index])
+                yield json.dumps({"index": index, "cached": True, "result": result}, ensure_ascii=False) + "\n"
+            for next_done in asyncio.as_completed(pending):
+                indices, cached, result = await next_done
+                for index in indices:
+                    line = {"index": index, "cached": cached, "result": rebase_readings(result, *readings[index])}
+                    yield json.dumps(line, ensure_ascii=False) + "\n"
+        finally:
+            # Client went away: stop the calls nobody will read
+            for task in pending:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.post("/grid")
+async def spoilage_grid(data: SpoilageGridInput):
+    # Whole temperature x humidity risk surface from the offline model in one
+    # vectorized call, for drawing a heatmap without any Gemini calls.
+    crop = canonical_name(data.crop_type, CROP_ALIASES)
+    storage = canonical_name(data.storage_type, {})
+    temperatures = np.linspace(data.temp_min, data.temp_max, data.temp_steps)
+    humidities = np.linspace(data.humidity_min, data.humidity_max, data.humidity_steps)
+    surface = spoilage_model.grid(crop, storage, data.days_stored, temperatures, humidities)
+    return {
+        "crop_type": crop,
+        "storage_type": storage,
+        "days_stored": data.days_stored,
+        "temperatures": np.round(temperatures, 2).tolist(),
+        "humidities": np.round(humidities, 2).tolist(),
+        "risk": surface.tolist()
     }
 
-    try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.post(GEMINI_URL, json=payload)
-            res_json = response.json()
-        
-        # print(f"RAW GOOGLE RESPONSE: {res_json}") # Helps debug if API fails
-        
-        if "error" in res_json:
-             raise Exception(f"Google API Error: {res_json['error'].get('message', res_json['error'])}")
-        
-        if "candidates" not in res_json:
-            raise Exception(f"Invalid AI Response. Raw JSON: {res_json}")
-            
-        ai_text = res_json["candidates"][0]["content"]["parts"][0]["text"]
-        clean_text = re.sub(r"```json|```", "", ai_text).strip()
-        result_json = json.loads(clean_text)
-        
-        SPOILAGE_CACHE[cache_key] = result_json
+async def assess(raw: SpoilageInput, data: SpoilageInput, cache_key: str):
+    template = prompts.SPOILAGE_STORE if data.action_type == "Store" else prompts.SPOILAGE_SELL
+    # Store inputs are banded, so the prompt describes the whole band the cached answer will serve
+    prompt = template.format(**data.model_dump(), temp_spread=TEMP_BAND / 2, humidity_spread=HUMIDITY_BAND / 2)
+
+    async def fetch_assessment():
+        result_json = await generate_json(prompt, SpoilageAssessment)
+        SPOILAGE_CACHE.set(cache_key, result_json)
         return result_json
 
+    try:
+        # Identical requests arriving together share a single Gemini call
+        result_json = await SPOILAGE_FLIGHTS.do(cache_key, fetch_assessment)
+        return rebase_readings(await localize("spoilage", result_json, data.language), data, raw)
+
     except Exception as e:
         print(f"⚠️ Spoilage AI Error: {e}")
-        # Fallback logic
-        eval_temp = data.temperature if data.action_type == "Store" else 28.0
-        eval_hum = data.humidity if data.action_type == "Store" else 65.0
-        score, level, cross_msg = 30, "Low", "Conditions seem standard."
-        
-        if eval_temp > 30 or eval_hum > 85:
-            score, level = 85, "High"
-            if data.action_type == "Store": cross_msg = "⚠️ Conditions are extremely harsh for storing. Consider Selling immediately."
-        elif eval_temp > 25 or (data.action_type == "Store" and data.days_stored > 7):
-            score, level = 55, "Medium"
-
-        return {
-            "risk_score": score,
-            "risk_level": level,
-            "cross_advice": cross_msg,
-            "analysis": f"### ⚠️ AI Connection Issue\n**Using offline estimation.**\n- **Estimated Risk:** {level} ({score}%)\n- **Advice:** Evaluate local conditions carefully.",
-            "logistics_recommendation": "### 🚚 Offline Logistics\n- Ensure temperature control.\n- Avoid moisture accumulation.",
-            "top_routes": "1. Main Highway\n2. Standard Rail" if data.action_type == "Sell" else "N/A",
-            "average_transit_days": 3 if data.action_type == "Sell" else 0,
-            "estimated_temp": 28.0 if data.action_type == "Sell" else 0,
-            "estimated_humidity": 65.0 if data.action_type == "Sell" else 0,
-            "logistics_viability": {"Refrigerated": 90, "Standard": 30, "Rail": 50}
-        }
\ No newline at end of file
+        metrics.fallback("spoilage")
+        return offline_assessment(raw, data)
+
+def offline_assessment(raw: SpoilageInput, data: SpoilageInput):
+    # Fallback logic: offline model with the exact readings (a typical 3-day
+    # road trip at 28°C / 65% RH for Sell requests)
+    if data.action_type == "Store":
+        score, level = spoilage_model.score_one(data.crop_type, data.storage_type, raw.temperature, raw.humidity, raw.days_stored)
+    else:
+        score, level = spoilage_model.score_one(data.crop_type, "Standard Godown", 28.0, 65.0, 3)
+    cross_msg = "Conditions seem standard."
+    if level == "High" and data.action_type == "Store":
+        cross_msg = "⚠️ Conditions are extremely harsh for storing. Consider Selling immediately."
+
+    return {
+        "risk_score": score,
+        "risk_level": level,
+        "cross_advice": cross_msg,
+        "analysis": f"### ⚠️ AI Connection Issue\n**Using offline estimation.**\n- **Estimated Risk:** {level} ({score}%)\n- **Advice:** Evaluate local conditions carefully.",
+        "logistics_recommendation": "### 🚚 Offline Logistics\n- Ensure temperature control.\n- Avoid moisture accumulation.",
+        "top_routes": "1. Main Highway\n2. Standard Rail" if data.action_type == "Sell" else "N/A",
+        "average_transit_days": 3 if data.action_type == "Sell" else 0,
+        "estimated_temp": 28.0 if data.action_type == "Sell" else raw.temperature,
+        "estimated_humidity": 65.0 if data.action_type == "Sell" else raw.humidity,
+        "logistics_viability": {"Refrigerated": 90, "Standard": 30, "Rail": 50}
+    }
\ No newline at end of file
@@ -0,0 +1,89 @@
+import numpy as np
+
+# Offline spoilage model: a Q10 temperature rule plus a humidity penalty
+# scales how fast a lot uses up its shelf life. Everything is written over
+# NumPy arrays so one call can score a single lot or a whole grid.
+
+# crop -> (shelf life in days at 25°C, Q10, lowest safe RH %, highest safe RH %)
+CROP_PARAMS = {
+    "Rice":       (240, 2.0, 55, 70),
+    "Wheat":      (240, 2.0, 55, 70),
+    "Maize":      (180, 2.2, 55, 70),
+    "Bajra":      (180, 2.0, 50, 70),
+    "Jowar":      (180, 2.0, 50, 70),
+    "Barley":     (200, 2.0, 55, 70),
+    "Millets":    (200, 2.0, 50, 70),
+    "Pulses":     (270, 2.0, 55, 70),
+    "Chickpea":   (270, 2.0, 55, 70),
+    "Soybean":    (150, 2.2, 55, 70),
+    "Groundnut":  (120, 2.3, 55, 70),
+    "Mustard":    (180, 2.0, 50, 70),
+    "Cotton":     (365, 1.8, 40, 75),
+    "Sugarcane":  (3,   2.5, 80, 95),
+    "Potato":     (45,  2.5, 85, 95),
+    "Onion":      (60,  2.3, 60, 75),
+    "Tomato":     (7,   2.8, 85, 95),
+    "Apple":      (30,  2.8, 85, 95),
+    "Banana":     (6,   3.0, 85, 95),
+    "Mango":      (6,   3.0, 85, 95),
+    "Cabbage":    (14,  2.8, 90, 98),
+    "Carrot":     (14,  2.8, 90, 98),
+    "Chilli":     (10,  2.7, 85, 95),
+    "Peas":       (5,   3.0, 90, 98),
+    "Vegetables": (7,   2.8, 85, 95),
+}
+DEFAULT_CROP = (14, 2.5, 60, 85)
+
+# storage -> (decay-rate multiplier, humidity buffering 0..1)
+STORAGE_PARAMS = {
+    "Cold Storage":    (0.6, 0.7),
+    "Silo":            (0.7, 0.6),
+    "Standard Godown": (1.0, 0.3),
+    "Open Air Shed":   (1.4, 0.0),
+}
+DEFAULT_STORAGE = (1.0, 0.2)
+
+# Every 10 points of RH outside the safe band speeds decay by this much
+HUMIDITY_PENALTY = 0.6
+
+
+def crop_params(crop):
+    return CROP_PARAMS.get(crop, DEFAULT_CROP)
+
+
+def storage_params(storage):
+    return STORAGE_PARAMS.get(storage, DEFAULT_STORAGE)
+
+
+def risk(crop, storage, temperature, humidity, days):
+    # Broadcasts over array inputs; returns risk scores 0-100 as floats
+    shelf_life, q10, rh_low, rh_high = crop_params(crop)
+    rate_factor, buffering = storage_params(storage)
+
+    temperature = np.asarray(temperature, dtype=float)
+    humidity = np.asarray(humidity, dtype=float)
+    days = np.maximum(np.asarray(days, dtype=float), 1.0)
+
+    temp_rate = q10 ** ((temperature - 25.0) / 10.0)
+    excess = np.maximum(humidity - rh_high, 0) + 0.5 * np.maximum(rh_low - humidity, 0)
+    humidity_rate = 1.0 + HUMIDITY_PENALTY * (1.0 - buffering) * excess / 10.0
+
+    # Fraction of the crop's shelf life used up by the stay
+    used = days * temp_rate * humidity_rate * rate_factor / shelf_life
+    return np.clip(100.0 * (1.0 - np.exp(-1.5 * used ** 2)), 0, 100)
+
+
+def level(scores):
+    scores = np.asarray(scores)
+    return np.where(scores >= 65, "High", np.where(scores >= 35, "Medium", "Low"))
+
+
+def score_one(crop, storage, temperature, humidity, days):
+    value = float(risk(crop, storage, temperature, humidity, days))
+    return int(round(value)), str(level(value))
+
+
+def grid(crop, storage, days, temperatures, humidities):
+    # Risk surface with one row per humidity and one column per temperature
+    t, h = np.meshgrid(np.asarray(temperatures, dtype=float), np.asarray(humidities, dtype=float))
+    return np.rint(risk(crop, storage, t, h, days)).astype(int)
@@ -0,0 +1,71 @@
+import json
+import hashlib
+from backend.cache import TTLCache
+from backend.gemini import generate_json
+from backend import prompts
+from backend.singleflight import SingleFlight
+from backend import metrics
+
+# Results are generated once in English (the language-neutral core, cached by
+# each router) and only their text fields are translated per language. The
+# numbers never go through the translator, so they match across languages.
+
+# Text fields each router is allowed to translate
+TEXT_FIELDS = {
+    "crop_planner": ["recommended_crops", "reasoning", "rotation_advice"],
+    "price": ["top_10_names", "expenditure_breakdown", "analysis", "logistics_advice"],
+    "spoilage": ["cross_advice", "analysis", "logistics_recommendation", "top_routes"],
+}
+
+BASE_LANGUAGE = "English"
+
+# Keyed on the English text itself, so a translation is reused by every
+# request whose core answer has the same wording.
+TRANSLATION_CACHE = TTLCache.from_env("translation", ttl=7 * 24 * 3600, max_entries=5000)
+TRANSLATION_FLIGHTS = SingleFlight("translation")
+
+
+def _merge(core, fields, translated):
+    # Only take a translated value if it has the same shape as the original
+    result = dict(core)
+    for field in fields:
+        value = translated.get(field)
+        original = core[field]
+        if isinstance(original, list):
+            if isinstance(value, list) and len(value) == len(original):
+                result[field] = value
+        elif isinstance(value, str) and value.strip():
+            result[field] = value
+    return result
+
+
+async def localize(namespace, core, language):
+    if not language or language == BASE_LANGUAGE:
+        return core
+
+    fields = [field for field in TEXT_FIELDS[namespace] if core.get(field) not in (None, "", [], "N/A")]
+    if not fields:
+        return core
+    texts = {field: core[field] for field in fields}
+    digest = hashlib.sha1(json.dumps(texts, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    cache_key = f"{namespace}:{language}:{digest}"
+
+    cached = await TRANSLATION_CACHE.get(cache_key)
+    if cached is not None:
+        return _merge(core, fields, cached)
+
+    prompt = prompts.TRANSLATE.format(language=language, texts=json.dumps(texts, ensure_ascii=False))
+
+    async def fetch_translation():
+        translated = await generate_json(prompt)
+        TRANSLATION_CACHE.set(cache_key, translated)
+        return translated
+
+    try:
+        translated = await TRANSLATION_FLIGHTS.do(cache_key, fetch_translation)
+    except Exception as e:
+        # The English core is still a correct answer; just not localized
+        print(f"⚠️ Translation Error ({language}): {e}")
+        metrics.fallback("translation")
+        return core
+    return _merge(core, fields, translated)
@@ -0,0 +1,169 @@
+import time
+import asyncio
+from datetime import datetime
+from backend import crop_engine
+from backend import request_log
+from backend import http_client
+from backend.singleflight import GROUPS
+from backend.ai_agent_api import AgentInput, settled_plan, plan_key, plan_cached
+from backend.price_api import PriceInput, price_answer, price_key, PRICE_CACHE
+from backend.spoilage_api import SpoilageInput, spoilage_answer, spoilage_key, SPOILAGE_CACHE
+from backend.canonical import canonicalize_plan, canonicalize_price, canonicalize_spoilage
+from backend import config
+
+
+# Background job that precomputes the most common crop planner, price and
+# spoilage answers so the first farmers after a deploy hit a warm cache.
+WARMUP_INTERVAL = float(config.get("WARMUP_INTERVAL", "0"))          # seconds between runs, 0 = run once
+WARMUP_RATE = float(config.get("WARMUP_RATE", "6"))                  # upstream calls per minute, translations included
+WARMUP_MAX_LIVE_INFLIGHT = int(config.get("WARMUP_MAX_LIVE_INFLIGHT", "4"))
+WARMUP_LOG_TOP = int(config.get("WARMUP_LOG_TOP", "50"))             # most frequent logged inputs per endpoint
+WARMUP_LANGUAGES = [lang.strip() for lang in config.get("WARMUP_LANGUAGES", "English").split(",") if lang.strip()]
+WARMUP_LOCATIONS = [loc.strip() for loc in config.get("WARMUP_LOCATIONS", "India").split(",") if loc.strip()]
+WARMUP_COST_PRICE = float(config.get("WARMUP_COST_PRICE", "20"))
+
+SEASONS = ["Kharif (Monsoon)", "Rabi (Winter)", "Zaid (Summer)"]
+MARKET_LEVELS = ["Local Market", "National Distribution"]
+# storage -> typical (temperature, humidity, days) for a warm-up assessment
+STORAGE_CONDITIONS = {
+    "Cold Storage": (4.0, 90.0, 30),
+    "Standard Godown": (28.0, 65.0, 14),
+    "Open Air Shed": (32.0, 70.0, 7),
+    "Silo": (25.0, 60.0, 90),
+}
+
+ENDPOINTS = {
+    "crop_planner": (AgentInput, canonicalize_plan, plan_key, plan_cached, settled_plan),
+    "price": (PriceInput, canonicalize_price, price_key, PRICE_CACHE.contains, price_answer),
+    "spoilage": (SpoilageInput, canonicalize_spoilage, spoilage_key, SPOILAGE_CACHE.contains, spoilage_answer),
+}
+
+STATUS = {
+    "running": False,
+    "runs": 0,
+    "started_at": None,
+    "finished_at": None,
+    "planned": {},
+    "warmed": {},
+    "already_cached": {},
+    "failed": {},
+}
+
+# Keep a reference so an on-demand run is not garbage collected mid-flight
+_background = set()
+
+
+def plan_jobs():
+    # Observed traffic first (most popular first), then combinations seeded from the data files
+    jobs = {name: [] for name in ENDPOINTS}
+    for name in ENDPOINTS:
+        jobs[name] += request_log.top(name, WARMUP_LOG_TOP)
+
+    crop_engine.ensure_loaded()
+    month = datetime.now().strftime("%B")
+    for crop in crop_engine.RULES:
+        for soil in crop_engine.SOILS:
+            for season in SEASONS:
+                jobs["crop_planner"].append({"last_crop": crop, "soil_type": soil, "rainfall": "Moderate", "season": season})
+        for location in WARMUP_LOCATIONS:
+            for market_level in MARKET_LEVELS:
+                jobs["price"].append({"crop": crop, "market_level": market_level, "location": location,
+                                      "product_type": "Standard Conventional", "month": month, "cost_price": WARMUP_COST_PRICE})
+        for storage, (temperature, humidity, days) in STORAGE_CONDITIONS.items():
+            jobs["spoilage"].append({"action_type": "Store", "crop_type": crop, "temperature": temperature,
+                                     "humidity": humidity, "storage_type": storage, "days_stored": days})
+
+    # Dedupe on the canonical cache key, keeping the first (most popular) occurrence
+    planned = {}
+    for name, payloads in jobs.items():
+        model, canonicalize, key_for, _, _ = ENDPOINTS[name]
+        seen, unique = set(), []
+        for payload in payloads:
+            payload = {k: v for k, v in payload.items() if k != "language"}
+            try:
+                item = model(**payload)
+            except ValueError:
+                continue
+            key = key_for(canonicalize(item))
+            if key not in seen:
+                seen.add(key)
+                unique.append(item)
+        planned[name] = unique
+    return planned
+
+
+def _live_inflight():
+    return sum(group.stats()["in_flight"] for group in GROUPS.values())
+
+
+async def run_once():
+    if STATUS["running"]:
+        return
+    STATUS.update(running=True, started_at=time.time(), finished_at=None)
+    # Warm-up traffic must not be mistaken for real demand in the request log
+    request_log.RECORDING.set(False)
+    # Counts every upstream request a job triggers (core call, narrative, translations)
+    calls = {"requests": 0}
+    http_client.CALL_COUNTER.set(calls)
+    interval = 60.0 / WARMUP_RATE if WARMUP_RATE > 0 else 0
+    try:
+        planned = await asyncio.to_thread(plan_jobs)
+        for counter in ("planned", "warmed", "already_cached", "failed"):
+            STATUS[counter] = {name: 0 for name in ENDPOINTS}
+        for name, items in planned.items():
+            STATUS["planned"][name] = len(items) * len(WARMUP_LANGUAGES)
+
+        print(f"🔥 Cache warm-up started: {sum(STATUS['planned'].values())} jobs at {WARMUP_RATE} upstream calls/min")
+        for name, items in planned.items():
+            _, canonicalize, key_for, cached, handler = ENDPOINTS[name]
+            for item in items:
+                key = key_for(canonicalize(item))
+                for language in WARMUP_LANGUAGES:
+                    if language == "English" and await cached(key):
+                        STATUS["already_cached"][name] += 1
+                        continue
+                    # Back off while live traffic is waiting on upstream calls
+                    while _live_inflight() >= WARMUP_MAX_LIVE_INFLIGHT:
+                        await asyncio.sleep(1.0)
+                    before = calls["requests"]
+                    await handler(item.model_copy(update={"language": language}))
+                    STATUS["warmed" if await cached(key) else "failed"][name] += 1
+                    # Rate budget: spread upstream calls out so live requests keep priority
+                    await asyncio.sleep(interval * (calls["requests"] - before))
+        print(f"🔥 Cache warm-up finished: {coverage()}")
+    finally:
+        STATUS.update(running=False, finished_at=time.time())
+        STATUS["runs"] += 1
+
+
+def coverage():
+    # Share of planned jobs whose answer is now in the cache
+    report = {}
+    for name, planned in STATUS["planned"].items():
+        covered = STATUS["warmed"].get(name, 0) + STATUS["already_cached"].get(name, 0)
+        report[name] = round(covered / planned, 3) if planned else 0.0
+    return report
+
+
+def status():
+    return {**STATUS, "coverage": coverage(), "rate_per_minute": WARMUP_RATE, "languages": WARMUP_LANGUAGES}
+
+
+def start():
+    # On-demand run (POST /admin/warmup)
+    task = asyncio.create_task(run_once())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+async def warm_forever():
+    # Started from the app lifespan when WARMUP_ON_STARTUP is set
+    while True:
+        try:
+            await run_once()
+        except Exception as e:
+            print(f"⚠️ Cache warm-up error: {e}")
+        if WARMUP_INTERVAL <= 0:
+            return
+        await asyncio.sleep(WARMUP_INTERVAL)
@@ -1,79 +1,257 @@
 from fastapi import APIRouter
 from pydantic import BaseModel, Field
-import requests
 from datetime import datetime
+import asyncio
+import time
+from backend.http_client import get_client
+from backend.cache import TTLCache
+from backend.canonical import clean
+from backend.singleflight import SingleFlight
+from backend import config
 
 router = APIRouter(prefix="/weather", tags=["Weather API"])
 
+# Overridable so benchmarks can point at a local stand-in
+GEOCODE_URL = config.get("OPEN_METEO_GEOCODE_URL", "https://geocoding-api.open-meteo.com/v1/search")
+FORECAST_URL = config.get("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Forecasts are shared per grid cell (0.1° is roughly 11 km, about the model resolution)
+WEATHER_GRID = float(config.get("WEATHER_GRID", "0.1"))
+# Open-Meteo refreshes its models roughly every 15 minutes to an hour
+FORECAST_FRESH_FOR = float(config.get("FORECAST_FRESH_FOR", "900"))
+
+# City names almost never move, so keep geocodes for a month
+GEOCODE_CACHE = TTLCache.from_env("geocode", ttl=30 * 24 * 3600, max_entries=5000)
+# Forecasts are kept well past their fresh period so they can be served stale while refreshing
+FORECAST_CACHE = TTLCache.from_env("forecast", ttl=6 * 3600, max_entries=5000)
+GEOCODE_FLIGHTS = SingleFlight("geocode")
+FORECAST_FLIGHTS = SingleFlight("forecast")
+
+# Open-Meteo accepts comma-separated coordinate lists; keep each upstream call modest
+BATCH_CHUNK = int(config.get("WEATHER_BATCH_CHUNK", "50"))
+BATCH_MAX_LOCATIONS = int(config.get("WEATHER_BATCH_MAX_LOCATIONS", "500"))
+# Concurrent geocoder lookups per batch; Open-Meteo's geocoder is rate limited
+GEOCODE_CONCURRENCY = int(config.get("WEATHER_GEOCODE_CONCURRENCY", "8"))
+
+# Keep references so background refreshes are not garbage collected mid-flight
+_refreshes = set()
+
+FORECAST_PARAMS = {
+    "current": "temperature_2m,relative_humidity_2m,wind_speed_10m,precipitation",
+    "hourly": "temperature_2m",
+    "daily": "temperature_2m_max",
+    "timezone": "auto"
+}
+
 class WeatherInput(BaseModel):
     location: str = Field("", description="Manual city name")
     lat: float = Field(None, description="Live Latitude")
     lon: float = Field(None, description="Live Longitude")
 
+class WeatherBatchInput(BaseModel):
+    locations: list[WeatherInput] = Field(..., min_length=1, max_length=BATCH_MAX_LOCATIONS, description="Farm plots to refresh")
+
+
+def grid_cell(lat, lon):
+    return (round(round(lat / WEATHER_GRID) * WEATHER_GRID, 4), round(round(lon / WEATHER_GRID) * WEATHER_GRID, 4))
+
+
+async def geocode(location):
+    # Returns {"lat", "lon", "name"} or None if Open-Meteo does not know the place
+    key = clean(location)
+    cached = await GEOCODE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    async def fetch():
+        client = get_client("open_meteo")
+        response = await client.get(GEOCODE_URL, params={"name": location.strip(), "count": 1})
+        # An outage or rate limit must not look like an unknown city
+        response.raise_for_status()
+        geo_res = response.json()
+        if "results" not in geo_res or not geo_res["results"]:
+            return None
+        place = geo_res["results"][0]
+        found = {"lat": place["latitude"], "lon": place["longitude"], "name": place["name"]}
+        GEOCODE_CACHE.set(key, found)
+        return found
+
+    return await GEOCODE_FLIGHTS.do(key, fetch)
+
+
+async def _fetch_forecast(cell):
+    client = get_client("open_meteo")
+    response = await client.get(FORECAST_URL, params={"latitude": cell[0], "longitude": cell[1], **FORECAST_PARAMS})
+    response.raise_for_status()
+    res = response.json()
+    FORECAST_CACHE.set(f"{cell[0]},{cell[1]}", {"fetched_at": time.time(), "data": res})
+    return res
+
+
+def _refresh_in_background(cell):
+    key = f"{cell[0]},{cell[1]}"
+    task = asyncio.create_task(FORECAST_FLIGHTS.do(key, lambda: _fetch_forecast(cell)))
+    _refreshes.add(task)
+
+    def done(t):
+        _refreshes.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            print(f"⚠️ Weather refresh failed for {key}: {t.exception()}")
+    task.add_done_callback(done)
+
+
+async def forecast(lat, lon):
+    # Stale-while-revalidate: fresh entries are returned as-is, stale ones are
+    # returned immediately while a background task refetches the cell.
+    cell = grid_cell(lat, lon)
+    key = f"{cell[0]},{cell[1]}"
+    cached = await FORECAST_CACHE.get(key)
+    if cached is not None:
+        if time.time() - cached["fetched_at"] > FORECAST_FRESH_FOR:
+            _refresh_in_background(cell)
+        return cached["data"]
+    return await FORECAST_FLIGHTS.do(key, lambda: _fetch_forecast(cell))
+
+
+async def _fetch_forecast_batch(cells):
+    # One upstream call for many cells; Open-Meteo returns a list in the same order
+    client = get_client("open_meteo")
+    params = {
+        "latitude": ",".join(str(cell[0]) for cell in cells),
+        "longitude": ",".join(str(cell[1]) for cell in cells),
+        **FORECAST_PARAMS
+    }
+    response = await client.get(FORECAST_URL, params=params)
+    response.raise_for_status()
+    res = response.json()
+    results = res if isinstance(res, list) else [res]
+    now = time.time()
+    for cell, item in zip(cells, results):
+        FORECAST_CACHE.set(f"{cell[0]},{cell[1]}", {"fetched_at": now, "data": item})
+    return dict(zip(cells, results))
+
+
+async def forecast_many(coords):
+    # Dedupe onto grid cells, serve what the cache has, and fetch the rest in chunks
+    cells = {grid_cell(lat, lon) for lat, lon in coords}
+    found, missing = {}, []
+    for cell in cells:
+        cached = await FORECAST_CACHE.get(f"{cell[0]},{cell[1]}")
+        if cached is None:
+            missing.append(cell)
+            continue
+        if time.time() - cached["fetched_at"] > FORECAST_FRESH_FOR:
+            _refresh_in_background(cell)
+        found[cell] = cached["data"]
+
+    chunks = [missing[i:i + BATCH_CHUNK] for i in range(0, len(missing), BATCH_CHUNK)]
+    for chunk_result in await asyncio.gather(*[_fetch_forecast_batch(chunk) for chunk in chunks], return_exceptions=True):
+        if isinstance(chunk_result, Exception):
+            print(f"⚠️ Weather batch error: {chunk_result}")
+            continue
+        found.update(chunk_result)
+    return found
+
+
+def build_report(city_name, res):
+    # Parse Current Data
+    current = res["current"]
+    bullet_points = [
+        f"**Location:** {city_name}",
+        f"**Current Temperature:** {current['temperature_2m']} °C",
+        f"**Humidity:** {current['relative_humidity_2m']}%",
+        f"**Precipitation:** {current['precipitation']} mm",
+        f"**Wind Speed:** {current['wind_speed_10m']} km/h"
+    ]
+
+    # Parse Hourly Data (Next 24 Hours)
+    hourly_times = res["hourly"]["time"][:24]
+    hourly_temps = res["hourly"]["temperature_2m"][:24]
+    # Format times neatly (e.g., "14:00")
+    formatted_hourly_times = [t.split("T")[1] for t in hourly_times]
+
+    # Parse Daily Data (Next 7 Days)
+    daily_dates = res["daily"]["time"]
+    daily_temps = res["daily"]["temperature_2m_max"]
+    # Format dates to Day Names (e.g., "Monday")
+    formatted_daily_dates = [datetime.strptime(d, "%Y-%m-%d").strftime("%A") for d in daily_dates]
+
+    return {
+        "bullet_points": bullet_points,
+        "hourly": {"labels": formatted_hourly_times, "data": hourly_temps},
+        "daily": {"labels": formatted_daily_dates, "data": daily_temps}
+    }
+
+
 @router.post("")
-def get_weather(data: WeatherInput):
+async def get_weather(data: WeatherInput):
     lat, lon = data.lat, data.lon
     city_name = "Your Live Location"
 
     # Step 1: If user typed a city, we convert it to coordinates (Geocoding API - Also Free!)
     if data.location:
-        geo_url = f"https://geocoding-api.open-meteo.com/v1/search?name={data.location}&count=1"
         try:
-            geo_res = requests.get(geo_url).json()
-            if "results" not in geo_res or not geo_res["results"]:
-                return {"error": f"Could not find the city: {data.location}"}
-            
-            lat = geo_res["results"][0]["latitude"]
-            lon = geo_res["results"][0]["longitude"]
-            city_name = geo_res["results"][0]["name"]
+            place = await geocode(data.location)
         except Exception:
             return {"error": "Failed to find location coordinates."}
+        if place is None:
+            return {"error": f"Could not find the city: {data.location}"}
+        lat, lon, city_name = place["lat"], place["lon"], place["name"]
 
     if lat is None or lon is None:
         return {"error": "Please provide a location or enable GPS."}
 
     # Step 2: Fetch Weather Data from Open-Meteo (NO API KEY NEEDED!)
-    weather_url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "current": "temperature_2m,relative_humidity_2m,wind_speed_10m,precipitation",
-        "hourly": "temperature_2m",
-        "daily": "temperature_2m_max",
-        "timezone": "auto"
-    }
-
     try:
-        res = requests.get(weather_url, params=params).json()
-
-        # Parse Current Data
-        current = res["current"]
-        bullet_points = [
-            f"**Location:** {city_name}",
-            f"**Current Temperature:** {current['temperature_2m']} °C",
-            f"**Humidity:** {current['relative_humidity_2m']}%",
-            f"**Precipitation:** {current['precipitation']} mm",
-            f"**Wind Speed:** {current['wind_speed_10m']} km/h"
-        ]
-
-        # Parse Hourly Data (Next 24 Hours)
-        hourly_times = res["hourly"]["time"][:24]
-        hourly_temps = res["hourly"]["temperature_2m"][:24]
-        # Format times neatly (e.g., "14:00")
-        formatted_hourly_times = [t.split("T")[1] for t in hourly_times]
-
-        # Parse Daily Data (Next 7 Days)
-        daily_dates = res["daily"]["time"]
-        daily_temps = res["daily"]["temperature_2m_max"]
-        # Format dates to Day Names (e.g., "Monday")
-        formatted_daily_dates = [datetime.strptime(d, "%Y-%m-%d").strftime("%A") for d in daily_dates]
-
-        return {
-            "bullet_points": bullet_points,
-            "hourly": {"labels": formatted_hourly_times, "data": hourly_temps},
-            "daily": {"labels": formatted_daily_dates, "data": daily_temps}
-        }
+        res = await forecast(lat, lon)
+        return build_report(city_name, res)
 
     except Exception as e:
         print(f"⚠️ Weather API Error: {e}")
-        return {"error": "Failed to fetch weather data from Open-Meteo."}
\ No newline at end of file
+        return {"error": "Failed to fetch weather data from Open-Meteo."}
+
+
+@router.post("/batch")
+async def get_weather_batch(data: WeatherBatchInput):
+    # Geocode the named plots (cached), then fetch every distinct grid cell in a few calls.
+    # Results come back in request order, each shaped exactly like POST /weather.
+    semaphore = asyncio.Semaphore(GEOCODE_CONCURRENCY)
+
+    async def bounded_geocode(location):
+        async with semaphore:
+            return await geocode(location)
+
+    places = await asyncio.gather(*[bounded_geocode(item.location) for item in data.locations if item.location],
+                                  return_exceptions=True)
+    places = iter(places)
+
+    resolved = []
+    for item in data.locations:
+        if item.location:
+            place = next(places)
+            if isinstance(place, Exception):
+                resolved.append({"error": "Failed to find location coordinates."})
+            elif place is None:
+                resolved.append({"error": f"Could not find the city: {item.location}"})
+            else:
+                resolved.append((place["lat"], place["lon"], place["name"]))
+        elif item.lat is None or item.lon is None:
+            resolved.append({"error": "Please provide a location or enable GPS."})
+        else:
+            resolved.append((item.lat, item.lon, "Your Live Location"))
+
+    forecasts = await forecast_many([entry[:2] for entry in resolved if isinstance(entry, tuple)])
+
+    results = []
+    for entry in resolved:
+        if not isinstance(entry, tuple):
+            results.append(entry)
+            continue
+        lat, lon, city_name = entry
+        res = forecasts.get(grid_cell(lat, lon))
+        try:
+            results.append(build_report(city_name, res))
+        except Exception as e:
+            print(f"⚠️ Weather API Error: {e}")
+            results.append({"error": "Failed to fetch weather data from Open-Meteo."})
+    return {"results": results}
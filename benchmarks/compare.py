@@ -0,0 +1,69 @@
+import argparse
+import json
+
+# Side-by-side view of two benchmark result files (see benchmarks/run.py):
+#
+#   python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+#
+# Per endpoint and concurrency level: requests/sec, p95 latency and the average
+# LLM prompt/response tokens per call, with the change from old to new.
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    return report, {(run["endpoint"], run["concurrency"]): run for run in report["results"]}
+
+
+def tokens(run, kind):
+    # Average tokens per LLM call across providers; None for runs without token data
+    usage = run.get("llm")
+    if not usage:
+        return None
+    calls = sum(provider["calls"] for provider in usage.values())
+    return sum(provider[f"{kind}_tokens"] for provider in usage.values()) / calls if calls else None
+
+
+def change(old, new, lower_is_better=False):
+    if old is None or new is None or not old:
+        return "-"
+    pct = (new - old) / old * 100
+    if lower_is_better:
+        pct = -pct
+    return f"{pct:+.0f}%"
+
+
+def fmt(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two AgroGuard benchmark result files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args(argv)
+    old_report, old_runs = load(args.old)
+    new_report, new_runs = load(args.new)
+
+    print(f"old {old_report['commit']} ({old_report['timestamp']})  vs  new {new_report['commit']} ({new_report['timestamp']})")
+    print("Positive percentages are improvements (more rps, lower p95, fewer tokens).\n")
+    header = f"{'endpoint':>13} {'c':>4} | {'rps':>17} {'':>5} | {'p95 ms':>17} {'':>5} | {'prompt tok':>15} {'':>5} | {'resp tok':>15} {'':>5}"
+    print(header)
+    print("-" * len(header))
+    for key in sorted(old_runs.keys() & new_runs.keys(), key=list(new_runs).index):
+        old, new = old_runs[key], new_runs[key]
+        columns = []
+        for a, b, lower in ((old["rps"], new["rps"], False),
+                            (old["latency_ms"]["p95"], new["latency_ms"]["p95"], True)):
+            columns.append(f"{fmt(a):>8}→{fmt(b):<8} {change(a, b, lower):>5}")
+        for kind in ("prompt", "response"):
+            a, b = tokens(old, kind), tokens(new, kind)
+            columns.append(f"{fmt(a):>7}→{fmt(b):<7} {change(a, b, True):>5}")
+        print(f"{key[0]:>13} {key[1]:>4} | " + " | ".join(columns))
+    missing = old_runs.keys() ^ new_runs.keys()
+    if missing:
+        print(f"\nOnly in one file: {', '.join(f'{name} c={level}' for name, level in sorted(missing))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import httpx
+import numpy as np
+
+# Offline load test: starts the upstream stand-ins and the backend as local
+# uvicorn processes, drives each router at the given concurrency levels and
+# writes requests/sec, latency percentiles and cache hit ratios as JSON.
+#
+#   python -m benchmarks.run --concurrency 1,8,32 --requests 200
+#
+# Stand-in behaviour is set with BENCH_* variables (see benchmarks/upstreams.py)
+# or the --latency-ms / --error-rate / --payload-kb shortcuts.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+CROPS = ["Rice", "Wheat", "Maize", "Cotton", "Sugarcane", "Soybean", "Tomato"]
+SOILS = ["Alluvial Soil", "Black Soil", "Red Soil", "Clay", "Loam"]
+
+
+# Each endpoint: (method, path, payload(tag, n), response caches that serve it).
+# `tag` is unique per concurrency level so every level starts from a cold cache;
+# `n` cycles through --distinct values so repeats within a level can hit.
+def crop_planner_payload(tag, n):
+    return {"last_crop": CROPS[n % len(CROPS)], "soil_type": SOILS[n % len(SOILS)], "rainfall": "Moderate",
+            "season": "Rabi (Winter)", "region": f"Bench {tag} {n}"}
+
+
+def price_payload(tag, n):
+    return {"crop": CROPS[n % len(CROPS)], "market_level": "Local Market", "location": f"Bench {tag} {n}",
+            "product_type": "Standard Conventional", "month": "March", "cost_price": 20}
+
+
+def spoilage_payload(tag, n):
+    if n % 2:
+        return {"action_type": "Sell", "crop_type": CROPS[n % len(CROPS)],
+                "current_location": f"Bench {tag} {n}", "selling_destination": "Mumbai"}
+    return {"action_type": "Store", "crop_type": CROPS[n % len(CROPS)], "temperature": 28.0,
+            "humidity": 65.0, "storage_type": f"Godown {tag} {n}", "days_stored": 14}
+
+
+def chatbot_payload(tag, n):
+    return {"message": f"How should I store onions after harvest? ({tag} {n})"}
+
+
+def weather_payload(tag, n):
+    return {"location": f"Bench Village {tag} {n}"}
+
+
+ENDPOINTS = {
+    "crop_planner": ("POST", "/crop_planner", crop_planner_payload, ["crop_planner"]),
+    "price": ("POST", "/price", price_payload, ["price"]),
+    "spoilage": ("POST", "/spoilage/predict", spoilage_payload, ["spoilage"]),
+    "chatbot": ("POST", "/chatbot", chatbot_payload, []),
+    "weather": ("POST", "/weather", weather_payload, ["geocode", "forecast"]),
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline AgroGuard load test against local upstream stand-ins")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of " + ", ".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint per concurrency level")
+    parser.add_argument("--distinct", type=int, default=20, help="distinct payloads per level (lower = more cache hits)")
+    parser.add_argument("--language", default="English", help="language field sent with every request")
+    parser.add_argument("--latency-ms", type=float, help="sets BENCH_UPSTREAM_LATENCY_MS")
+    parser.add_argument("--error-rate", type=float, help="sets BENCH_UPSTREAM_ERROR_RATE")
+    parser.add_argument("--payload-kb", type=float, help="sets BENCH_UPSTREAM_PAYLOAD_KB")
+    parser.add_argument("--workers", type=int, default=1, help="backend uvicorn workers (cache stats cover one worker)")
+    parser.add_argument("--port", type=int, default=8800, help="backend port; the stand-ins use port + 100")
+    parser.add_argument("--output", help="result file (default benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--verbose", action="store_true", help="show backend and stand-in logs")
+    return parser.parse_args(argv)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def start_server(app_path, port, env, verbose, workers=1):
+    output = None if verbose else subprocess.DEVNULL
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=output, stderr=output,
+    )
+
+
+async def wait_ready(client, url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 1) if values else None
+
+
+def cache_delta(before, after, names):
+    hits = sum(after.get(name, {}).get("hits", 0) - before.get(name, {}).get("hits", 0) for name in names)
+    misses = sum(after.get(name, {}).get("misses", 0) - before.get(name, {}).get("misses", 0) for name in names)
+    lookups = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": round(hits / lookups, 3) if lookups else None}
+
+
+def calls_delta(before, after):
+    return {provider: count - before.get(provider, 0) for provider, count in after.items() if count - before.get(provider, 0)}
+
+
+def llm_delta(before, after):
+    # Per provider LLM calls and tokens spent during a scenario, from /admin/tokens
+    if before is None or after is None:
+        return None
+    totals = {}
+    for endpoint, providers in after.items():
+        for provider, usage in providers.items():
+            old = before.get(endpoint, {}).get(provider, {})
+            total = totals.setdefault(provider, {"calls": 0, "prompt_tokens": 0, "response_tokens": 0, "invalid_responses": 0})
+            for key in total:
+                total[key] += usage.get(key, 0) - old.get(key, 0)
+    for provider, total in list(totals.items()):
+        if not total["calls"]:
+            del totals[provider]
+            continue
+        total["avg_prompt_tokens"] = round(total["prompt_tokens"] / total["calls"], 1)
+        total["avg_response_tokens"] = round(total["response_tokens"] / total["calls"], 1)
+    return totals
+
+
+async def token_usage(client):
+    # None when the backend under test predates /admin/tokens
+    response = await client.get("/admin/tokens")
+    return response.json() if response.status_code == 200 else None
+
+
+async def drive(client, method, path, make_payload, tag, args, concurrency):
+    # `concurrency` workers pull request numbers from a shared counter until `requests` are sent
+    latencies, statuses = [], {}
+    counter = iter(range(args.requests))
+
+    async def worker():
+        for i in counter:
+            payload = {**make_payload(tag, i % args.distinct), "language": args.language}
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=payload)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": args.requests,
+        "errors": args.requests - statuses.get("200", 0),
+        "statuses": statuses,
+        "duration_s": round(elapsed, 3),
+        "rps": round(args.requests / elapsed, 1),
+        "latency_ms": {"mean": round(float(np.mean(latencies)), 1), "p50": percentile(latencies, 50),
+                       "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+                       "max": round(max(latencies), 1)},
+    }
+
+
+async def benchmark(args):
+    upstream_port = args.port + 100
+    upstream = f"http://127.0.0.1:{upstream_port}"
+    backend = f"http://127.0.0.1:{args.port}"
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    env = dict(os.environ)
+    for flag, name in ((args.latency_ms, "LATENCY_MS"), (args.error_rate, "ERROR_RATE"), (args.payload_kb, "PAYLOAD_KB")):
+        if flag is not None:
+            env[f"BENCH_UPSTREAM_{name}"] = str(flag)
+    workdir = tempfile.mkdtemp(prefix="agroguard-bench-")
+    backend_env = {
+        **env,
+        "GEMINI_API_KEY": "bench",
+        "GEMINI_MODEL_URL": f"{upstream}/v1beta/models/stand-in:generateContent",
+        "GROQ_API_KEY": "bench",
+        "GROQ_URL": f"{upstream}/openai/v1/chat/completions",
+        "OPEN_METEO_GEOCODE_URL": f"{upstream}/v1/search",
+        "OPEN_METEO_FORECAST_URL": f"{upstream}/v1/forecast",
+        # A private disk cache and no request log, so runs do not leak into each other
+        "CACHE_DB_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "REQUEST_LOG_PATH": "",
+        "WARMUP_ON_STARTUP": "0",
+    }
+
+    started = time.perf_counter()
+    servers = [start_server("benchmarks.upstreams:app", upstream_port, env, args.verbose),
+               start_server("backend.main:app", args.port, backend_env, args.verbose, args.workers)]
+    results = []
+    try:
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        async with httpx.AsyncClient(base_url=backend, timeout=120, limits=limits) as client:
+            await wait_ready(client, f"{upstream}/_stats")
+            await wait_ready(client, "/healthz")
+            ready_ms = round((time.perf_counter() - started) * 1000, 1)
+
+            for level_index, concurrency in enumerate(levels):
+                for name in endpoints:
+                    method, path, make_payload, caches = ENDPOINTS[name]
+                    caches_before = (await client.get("/admin/cache")).json()
+                    upstream_before = (await client.get(f"{upstream}/_stats")).json()
+                    tokens_before = await token_usage(client)
+                    run = await drive(client, method, path, make_payload, f"L{level_index}", args, concurrency)
+                    caches_after = (await client.get("/admin/cache")).json()
+                    upstream_after = (await client.get(f"{upstream}/_stats")).json()
+                    tokens_after = await token_usage(client)
+                    run.update(endpoint=name, path=path, concurrency=concurrency,
+                               cache=cache_delta(caches_before, caches_after, caches) if caches else None,
+                               upstream_calls=calls_delta(upstream_before["calls"], upstream_after["calls"]),
+                               # Injected upstream failures; the backend answers these with its fallbacks
+                               upstream_errors=calls_delta(upstream_before["errors"], upstream_after["errors"]),
+                               llm=llm_delta(tokens_before, tokens_after))
+                    results.append(run)
+                    print(f"{name:>13} c={concurrency:<4} {run['rps']:>8.1f} rps  p50 {run['latency_ms']['p50']:>8.1f} ms  "
+                          f"p95 {run['latency_ms']['p95']:>8.1f} ms  p99 {run['latency_ms']['p99']:>8.1f} ms  "
+                          f"hit {run['cache']['hit_ratio'] if run['cache'] else '-'}  errors {run['errors']}")
+            pool = (await client.get("/admin/pool")).json()
+    finally:
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            server.wait()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "settings": {
+            "endpoints": endpoints, "concurrency": levels, "requests": args.requests, "distinct": args.distinct,
+            "language": args.language, "workers": args.workers,
+            "upstream": {key: value for key, value in env.items() if key.startswith("BENCH_")},
+        },
+        "backend_ready_ms": ready_ms,
+        "results": results,
+        "pool": pool,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(benchmark(args))
+    path = args.output or os.path.join(RESULTS_DIR, f"{report['timestamp'].replace(':', '')}-{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"📊 Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Local stand-ins for the Gemini generateContent, Groq chat completions and
+# Open-Meteo forecast/geocoding APIs, shaped like the real responses so the
+# backend runs unmodified against them. Started by benchmarks/run.py:
+#
+#   uvicorn benchmarks.upstreams:app --port 8900
+#
+# Behaviour per provider (gemini, groq, open_meteo), e.g. BENCH_GEMINI_LATENCY_MS;
+# the unprefixed BENCH_UPSTREAM_* value is the default for all three:
+#   LATENCY_MS   mean added latency
+#   JITTER_MS    +/- uniform jitter around the mean
+#   ERROR_RATE   share of calls answered with an HTTP 500 API error (0..1)
+#   PAYLOAD_KB   extra text padded into each response
+
+
+def setting(provider, name, default):
+    value = os.getenv(f"BENCH_{provider.upper()}_{name}", os.getenv(f"BENCH_UPSTREAM_{name}", default))
+    return float(value)
+
+
+CALLS = Counter()
+ERRORS = Counter()
+
+app = FastAPI(title="AgroGuard upstream stand-ins")
+
+
+async def behave(provider):
+    # Returns an error response when this call should fail, else None
+    CALLS[provider] += 1
+    latency = setting(provider, "LATENCY_MS", "200")
+    jitter = setting(provider, "JITTER_MS", "50")
+    await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter)) / 1000)
+    if random.random() < setting(provider, "ERROR_RATE", "0"):
+        ERRORS[provider] += 1
+        return JSONResponse({"error": {"code": 500, "message": f"{provider} stand-in injected error"}}, status_code=500)
+    return None
+
+
+def padding(provider):
+    size = int(setting(provider, "PAYLOAD_KB", "1") * 1024)
+    return ("Lorem ipsum dolor sit amet. " * (size // 28 + 1))[:size]
+
+
+def schema_answer(schema, pad):
+    # Synthesize a reply matching a Gemini responseSchema; one Markdown text
+    # field carries the padding
+    pad = [pad]
+
+    def fill(node):
+        kind = node["type"]
+        if "enum" in node:
+            return random.choice(node["enum"])
+        if kind == "OBJECT":
+            return {name: fill(prop) for name, prop in node["properties"].items()}
+        if kind == "ARRAY":
+            return [fill(node["items"]) for _ in range(node.get("minItems", 2))]
+        if kind == "INTEGER":
+            return random.randint(node.get("minimum", 1), node.get("maximum", 1000))
+        if kind == "NUMBER":
+            return round(random.uniform(node.get("minimum", 1), node.get("maximum", 1000)), 2)
+        if kind == "BOOLEAN":
+            return random.random() < 0.5
+        if "Markdown" in node.get("description", ""):
+            return "- " + (pad.pop() if pad else "Sample point.")
+        return f"Sample {random.randint(1, 99)}"
+
+    return fill(schema)
+
+
+def gemini_answer(prompt):
+    # Schema-less prompts are only the translation layer's: echo the English
+    # texts back, since the shapes must match for the merge to accept them
+    return json.loads(prompt[prompt.index("{"):prompt.rindex("}") + 1])
+
+
+@app.post("/v1beta/models/{model}")
+async def generate_content(model: str, request: Request):
+    failed = await behave("gemini")
+    if failed:
+        return failed
+    body = await request.json()
+    prompt = body["contents"][0]["parts"][0]["text"]
+    schema = body.get("generationConfig", {}).get("responseSchema")
+    if schema is None:
+        text = json.dumps(gemini_answer(prompt), ensure_ascii=False)
+        prompt_tokens = len(prompt) // 4
+    else:
+        text = json.dumps(schema_answer(schema, padding("gemini")), ensure_ascii=False)
+        # Gemini bills the schema as part of the prompt
+        prompt_tokens = (len(prompt) + len(json.dumps(schema, separators=(",", ":")))) // 4
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(text) // 4}}
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    failed = await behave("groq")
+    if failed:
+        return failed
+    body = await request.json()
+    reply = "- Water early in the morning.\n- " + padding("groq")
+    usage = {"prompt_tokens": sum(len(m["content"]) for m in body["messages"]) // 4, "completion_tokens": len(reply) // 4}
+    if not body.get("stream"):
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage}
+
+    async def stream():
+        words = reply.split(" ")
+        for i in range(0, len(words), 8):
+            chunk = " ".join(words[i:i + 8]) + " "
+            yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': chunk}}]})}\n\n"
+            await asyncio.sleep(0.005)
+        # Groq reports usage on the last chunk
+        yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {}}], 'x_groq': {'usage': usage}})}\n\n"
+        yield "data: [DONE]\n\n"
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/v1/search")
+async def geocode(name: str, count: int = 1):
+    failed = await behave("open_meteo")
+    if failed:
+        return failed
+    # Deterministic coordinates per name, spread over India
+    digest = int(hashlib.sha1(name.casefold().encode()).hexdigest(), 16)
+    return {"results": [{"name": name.title(), "latitude": round(8 + (digest % 2800) / 100, 4),
+                         "longitude": round(68 + (digest // 2800 % 2900) / 100, 4)}]}
+
+
+def one_forecast(lat, lon):
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "current": {"temperature_2m": 29.1, "relative_humidity_2m": 64, "wind_speed_10m": 8.2, "precipitation": 0.0},
+        "hourly": {"time": [(now + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(48)],
+                   "temperature_2m": [round(24 + 6 * ((h % 24) / 24), 1) for h in range(48)]},
+        "daily": {"time": [(now + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(7)],
+                  "temperature_2m_max": [32.0 + d / 2 for d in range(7)]},
+        "padding": padding("open_meteo"),
+    }
+
+
+@app.get("/v1/forecast")
+async def forecast(latitude: str, longitude: str):
+    failed = await behave("open_meteo")
+    if failed:
+        return failed
+    # Comma-separated coordinate lists return a list, like the real API
+    lats, lons = latitude.split(","), longitude.split(",")
+    results = [one_forecast(float(lat), float(lon)) for lat, lon in zip(lats, lons)]
+    return results if len(results) > 1 else results[0]
+
+
+@app.get("/_stats")
+async def stats():
+    return {"calls": dict(CALLS), "errors": dict(ERRORS)}
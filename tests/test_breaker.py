@@ -0,0 +1,30 @@
+import asyncio
+import pytest
+from backend.breaker import CLOSED, HALF_OPEN, CircuitBreaker, Guard, Limiter
+
+
+def tripped_guard(name):
+    breaker = CircuitBreaker(name, min_calls=1, failure_ratio=0.5, open_for=0.0, probes=1)
+    guard = Guard(name, breaker, Limiter(name, max_inflight=1, max_queue=4, queue_timeout=5.0))
+    breaker.record(False, 0.0, probe=False)
+    return guard
+
+
+def test_cancelled_queued_probe_frees_its_slot():
+    async def scenario():
+        guard = tripped_guard("test-cancelled-probe")
+        # Hold the only limiter slot so the probe has to queue
+        await guard.limiter.acquire()
+        waiting = asyncio.create_task(guard.call().__aenter__())
+        await asyncio.sleep(0)
+        assert guard.breaker.state == HALF_OPEN and guard.limiter.queued == 1
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        guard.limiter.release()
+
+        async with guard.call():
+            pass
+        assert guard.breaker.state == CLOSED
+
+    asyncio.run(scenario())